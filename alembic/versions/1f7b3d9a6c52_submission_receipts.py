@@ -0,0 +1,40 @@
+"""Submission receipts
+
+Revision ID: 1f7b3d9a6c52
+Revises: e4a8c1f25b97
+Create Date: 2026-10-18 22:41:09.538120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f7b3d9a6c52'
+down_revision = 'e4a8c1f25b97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('submission_receipts',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('student_id', sa.String(), nullable=False),
+    sa.Column('assessment_id', sa.String(), nullable=False),
+    sa.Column('idempotency_key', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['assessment_id'], ['assessments.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('assessment_id', 'student_id', name='_receipt_assessment_student_uc')
+    )
+    op.create_index(op.f('ix_submission_receipts_id'), 'submission_receipts', ['id'], unique=False)
+    # students who submitted already must not be able to submit again
+    op.execute("INSERT INTO submission_receipts (id, assessment_id, student_id, created_at) "
+               "SELECT substr(md5(assessment_id || ':' || student_id), 1, 15), assessment_id, student_id, now() "
+               "FROM submissions GROUP BY assessment_id, student_id")
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_submission_receipts_id'), table_name='submission_receipts')
+    op.drop_table('submission_receipts')
@@ -0,0 +1,24 @@
+"""Assessment answer key version
+
+Revision ID: 5c2e7a91d4f0
+Revises: 83f8dc17963b
+Create Date: 2026-10-18 18:02:11.204113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2e7a91d4f0'
+down_revision = '83f8dc17963b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('assessments', sa.Column('key_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('assessments', 'key_version')
@@ -0,0 +1,24 @@
+"""Assessment nlp grader
+
+Revision ID: 9d41b6e0c3a7
+Revises: 5c2e7a91d4f0
+Create Date: 2026-10-18 19:12:40.518237
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d41b6e0c3a7'
+down_revision = '5c2e7a91d4f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('assessments', sa.Column('grader', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('assessments', 'grader')
@@ -0,0 +1,38 @@
+"""Draft answers
+
+Revision ID: e4a8c1f25b97
+Revises: 9d41b6e0c3a7
+Create Date: 2026-10-18 21:03:17.204815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a8c1f25b97'
+down_revision = '9d41b6e0c3a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('drafts',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('student_id', sa.String(), nullable=False),
+    sa.Column('question_id', sa.String(), nullable=False),
+    sa.Column('assessment_id', sa.String(), nullable=False),
+    sa.Column('answers', sa.JSON(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['assessment_id'], ['assessments.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('assessment_id', 'student_id', 'question_id', name='_draft_assessment_student_question_uc')
+    )
+    op.create_index(op.f('ix_drafts_id'), 'drafts', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_drafts_id'), table_name='drafts')
+    op.drop_table('drafts')
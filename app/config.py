@@ -15,6 +15,10 @@ ML_DIR_PATH = os.path.join(ROOT_DIR, "ml")
 MODEL_DIR_PATH = os.path.join(ML_DIR_PATH, "models")
 ML_MODEL_DIR = os.makedirs(MODEL_DIR_PATH, exist_ok=True)
 ML_MODEL_PATH = os.path.join(MODEL_DIR_PATH, "lgbm_class.model.pkl")
+EMBEDDING_CACHE_DIR = os.path.join(ML_DIR_PATH, "embeddings")
+EMBEDDING_CACHE_SIZE = 200_000
+ANSWER_KEY_CACHE_SIZE = 256
+PAPER_CACHE_SIZE = 256
 API_URL = "https://api-inference.huggingface.co/models/sentence-transformers/all-MiniLM-L6-v2"
 
 
@@ -32,6 +36,25 @@ class Settings(BaseSettings):
     cloud_api_secret: str
     cloud_api_name: str
     api_token: str
+    similarity_backend: str = 'http'
+    embedding_cache: bool = True
+    inference_concurrency: int = 4
+    inference_batch_size: int = 64
+    inference_timeout: float = 30
+    inference_max_retries: int = 5
+    marking_workers: int = 2
+    marking_processes: int = 1
+    marking_chunk_rows: int = 200_000
+    preload_grader: bool = False
+    incremental_marking: bool = False
+    sub_obj_matching: str = 'substring'
+    fuzzy_max_edits: int = 2
+    fuzzy_chars_per_edit: int = 4
+    group_commit: bool = False
+    group_commit_max_batch: int = 200
+    group_commit_max_delay_ms: float = 5
+    group_commit_timeout: float = 30
+    draft_flush_seconds: float = 2
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,158 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from nanoid import generate
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+
+
+logger = logging.getLogger(__name__)
+
+# 6 bound parameters per row, well under PostgreSQL's 65535 limit
+CHUNK_SIZE = 5000
+
+# question_id -> [{"stu_answer": ..., "stu_answer_id": ...}]
+Answers = Dict[str, List[dict]]
+
+
+class DraftBuffer:
+    """Draft answers held in memory and written to the drafts table behind the requests.
+
+    Saving a draft only touches memory; a thread upserts whatever changed
+    every ``flush_interval`` seconds. Each process buffers the saves it
+    received, a final submission picks them up with ``take``.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # one flush at a time
+        self._flush_lock = threading.Lock()
+        self._dirty: Dict[Tuple[str, str], Dict[str, Tuple[List[dict], datetime]]] = {}
+        # the answers a flush is writing, a submission may still take them
+        self._flushing: Dict[Tuple[str, str], Dict[str, Tuple[List[dict], datetime]]] = {}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='draft-writer', daemon=True)
+            self._thread.start()
+
+    def put(self, assessment_id: str, student_id: str, answers: Answers):
+        now = datetime.now()
+        with self._lock:
+            self._ensure_started()
+            self._dirty.setdefault((assessment_id, student_id), {}).update(
+                {question_id: (question_answers, now) for question_id, question_answers in answers.items()})
+
+    def pending(self, assessment_id: str, student_id: str) -> Answers:
+        with self._lock:
+            dirty = {**self._flushing.get((assessment_id, student_id), {}),
+                     **self._dirty.get((assessment_id, student_id), {})}
+        return {question_id: question_answers for question_id, (question_answers, _) in dirty.items()}
+
+    def take(self, assessment_id: str, student_id: str) -> Answers:
+        """Removes and returns the unflushed answers of a student, without waiting for a flush."""
+        with self._lock:
+            dirty = {**self._flushing.pop((assessment_id, student_id), {}),
+                     **self._dirty.pop((assessment_id, student_id), {})}
+        return {question_id: question_answers for question_id, (question_answers, _) in dirty.items()}
+
+    def _write(self, db: Session, dirty: Dict[Tuple[str, str], Dict[str, Tuple[List[dict], datetime]]]) -> int:
+        rows = [{'id': generate(size=15), 'assessment_id': assessment_id, 'student_id': student_id,
+                 'question_id': question_id, 'answers': question_answers, 'updated_at': updated_at}
+                for (assessment_id, student_id), questions in dirty.items()
+                for question_id, (question_answers, updated_at) in questions.items()]
+        drafts = models.Draft.__table__
+        for start in range(0, len(rows), CHUNK_SIZE):
+            stmt = insert(drafts).values(rows[start:start + CHUNK_SIZE])
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=['assessment_id', 'student_id', 'question_id'],
+                set_={'answers': stmt.excluded.answers, 'updated_at': stmt.excluded.updated_at}))
+        # saves that reached the buffer as the student submitted would linger otherwise
+        receipts = models.SubmissionReceipt.__table__
+        students = list(dirty)
+        for start in range(0, len(students), CHUNK_SIZE):
+            db.execute(delete(drafts).where(
+                tuple_(drafts.c.assessment_id, drafts.c.student_id).in_(students[start:start + CHUNK_SIZE]),
+                select(receipts.c.id).where(receipts.c.assessment_id == drafts.c.assessment_id,
+                                            receipts.c.student_id == drafts.c.student_id).exists()))
+        return len(rows)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._dirty = self._dirty, {}
+                dirty = dict(self._flushing)
+            if not dirty:
+                return 0
+            db = SessionLocal()
+            try:
+                try:
+                    written = self._write(db, dirty)
+                    db.commit()
+                    return written
+                except Exception:
+                    db.rollback()
+                    logger.exception("writing the drafts of %d students failed, writing them one by one", len(dirty))
+                # a bad answer only costs its own student's draft
+                written = 0
+                for student in dirty:
+                    with self._lock:
+                        # a submission that took them promotes them itself
+                        questions = self._flushing.get(student)
+                    if questions is None:
+                        continue
+                    try:
+                        written += self._write(db, {student: questions})
+                        db.commit()
+                    except IntegrityError:
+                        db.rollback()
+                        logger.exception("dropping the unwritable draft answers of %s", student)
+                    except Exception:
+                        db.rollback()
+                        logger.exception("keeping the draft answers of %s for the next flush", student)
+                        with self._lock:
+                            if student in self._flushing:
+                                # answers saved since are newer than the failed ones
+                                self._dirty[student] = {**questions, **self._dirty.get(student, {})}
+                return written
+            finally:
+                with self._lock:
+                    self._flushing = {}
+                db.close()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        """Writes what is buffered and ends the flushing thread."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+def stored(db: Session, assessment_id: str, student_id: str) -> Answers:
+    return dict(db.query(models.Draft.question_id, models.Draft.answers).filter(
+        models.Draft.assessment_id == assessment_id, models.Draft.student_id == student_id).all())
+
+
+def load(db: Session, assessment_id: str, student_id: str) -> Answers:
+    """The draft of a student, saved answers not yet written included."""
+    return {**stored(db, assessment_id, student_id), **buffer.pending(assessment_id, student_id)}
+
+
+buffer = DraftBuffer(settings.draft_flush_seconds)
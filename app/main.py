@@ -6,10 +6,11 @@ from fastapi.middleware import Middleware
 from fastapi import FastAPI
 import cloudinary.uploader
 
-from app import config
+from app import config, drafts, submission_writer
 
 from . import models
 from .database import engine
+from .marking import grader
 from .routers import course, user, auth, student, instructor, assessment, question, answer, submission, instruction, mark, assessment_times
 # from .config import settings
 
@@ -58,6 +59,16 @@ app.include_router(submission.router)
 app.include_router(mark.router)
 app.include_router(assessment_times.router)
 
+if config.settings.preload_grader:
+    # loaded in the parent so forked workers share the model's memory
+    grader.load_model()
+
+
+@app.on_event("shutdown")
+def flush_submissions():
+    submission_writer.writer.stop()
+    drafts.buffer.stop()
+
 
 @app.get("/")
 def root():
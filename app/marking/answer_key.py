@@ -0,0 +1,106 @@
+import copy
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app import config, models
+
+
+QUESTION_FIELDS = ['id', 'assessment_id', 'question', 'mark', 'question_type', 'tolerance',
+                   'is_multi_choice', 'num_answer']
+
+# the correct options of every question in the shape of the marking join
+KEY_COLUMNS = ['assessment_id', 'question_id', 'mark', 'question_type', 'is_multi_choice',
+               'tolerance', 'num_answer', 'ref_answer_id', 'ref_answer']
+
+
+class AnswerKey:
+    """The questions and options of an assessment, compiled once per version.
+
+    ``rows`` holds one row per correct option for marking, ``questions``
+    and ``options`` what the review pages show.
+    """
+
+    def __init__(self, assessment_id: str, version: int, questions: List[dict], options: List[dict]):
+        self.assessment_id = assessment_id
+        self.version = version
+        self.questions = questions
+        self.options: Dict[str, List[dict]] = {}
+        for option in options:
+            self.options.setdefault(option['question_id'], []).append(
+                {'id': option['id'], 'option': option['option'], 'is_correct': option['is_correct']})
+        self.by_id = {question['id']: question for question in questions}
+        rows = []
+        for question_id, question_options in self.options.items():
+            question = self.by_id[question_id]
+            rows += [(assessment_id, question_id, question['mark'], question['question_type'],
+                      question['is_multi_choice'], question['tolerance'], question['num_answer'],
+                      option['id'], option['option'])
+                     for option in question_options if option['is_correct']]
+        self.rows = pd.DataFrame.from_records(rows, columns=KEY_COLUMNS)
+        self.correct_counts: Dict[str, int] = self.rows['question_id'].value_counts().to_dict()
+        self.total_question_mark = sum(question['mark'] for question in questions)
+
+    def question_ids(self, question_type: Optional[str] = None,
+                     is_multi_choice: Optional[bool] = None) -> List[str]:
+        """Questions with a correct option, optionally of one type."""
+        return [question['id'] for question in self.questions
+                if question['id'] in self.correct_counts
+                and (question_type is None or question['question_type'] == question_type)
+                and (is_multi_choice is None or question['is_multi_choice'] == is_multi_choice)]
+
+    def review_questions(self) -> List[dict]:
+        # copies, callers add the student's answers and marks to them
+        return [dict(question, answers=copy.deepcopy(self.options.get(question['id'], [])))
+                for question in self.questions]
+
+
+_lock = threading.Lock()
+_cache: 'OrderedDict[str, AnswerKey]' = OrderedDict()
+
+
+def compile_key(db: Session, assessment_id: str, version: int) -> AnswerKey:
+    questions = db.query(*[getattr(models.Question, field) for field in QUESTION_FIELDS]).filter(
+        models.Question.assessment_id == assessment_id).all()
+    options = db.query(models.Option.id, models.Option.question_id, models.Option.option,
+                       models.Option.is_correct).join(
+        models.Question, models.Option.question_id == models.Question.id).filter(
+        models.Question.assessment_id == assessment_id).all()
+    return AnswerKey(assessment_id, version, [dict(zip(QUESTION_FIELDS, question)) for question in questions],
+                     [option._asdict() for option in options])
+
+
+def current_version(db: Session, assessment_id: str) -> Optional[int]:
+    return db.query(models.Assessment.key_version).filter(models.Assessment.id == assessment_id).scalar()
+
+
+def get(db: Session, assessment_id: str) -> Optional[AnswerKey]:
+    """The answer key of an assessment, rebuilt only when its version moved on."""
+    version = current_version(db, assessment_id)
+    if version is None:
+        return None
+    with _lock:
+        key = _cache.get(assessment_id)
+        if key is not None and key.version == version:
+            _cache.move_to_end(assessment_id)
+            return key
+    key = compile_key(db, assessment_id, version)
+    with _lock:
+        _cache[assessment_id] = key
+        _cache.move_to_end(assessment_id)
+        while len(_cache) > config.ANSWER_KEY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return key
+
+
+def bump_version(db: Session, assessment_id):
+    """Marks the cached answer key and paper of an assessment stale, commits with the caller's change.
+
+    ``assessment_id`` may be a scalar subquery resolving to the id.
+    """
+    db.query(models.Assessment).filter(models.Assessment.id == assessment_id).update(
+        {models.Assessment.key_version: models.Assessment.key_version + 1},
+        synchronize_session=False)
@@ -0,0 +1,131 @@
+import fcntl
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    return hashlib.sha1(f'{model_name}\0{text}'.encode()).digest()
+
+
+class EmbeddingStore:
+    """Content addressed float32 vectors in a memory-mapped file with LRU eviction.
+
+    The vectors live in ``vectors.f32``, one row per slot, and ``index.npz``
+    holds the keys in least to most recently used order with their slots.
+    A lock file serialises workers of different processes sharing the store.
+    Reads only reorder the keys in memory, the order is saved with the next
+    ``put``.
+    """
+
+    def __init__(self, directory: str, capacity: int):
+        self.directory = directory
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.dimensions: Optional[int] = None
+        self._slots: "OrderedDict[bytes, int]" = OrderedDict()
+        # keys read since the index was last saved, oldest read first
+        self._touched: "OrderedDict[bytes, None]" = OrderedDict()
+        self._vectors: Optional[np.memmap] = None
+        self._index_mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.npz')
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.directory, 'vectors.f32')
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._reload()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reload(self):
+        # pick up entries written by other workers since the last access
+        try:
+            mtime = os.stat(self._index_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._index_mtime:
+            return
+        with np.load(self._index_path) as index:
+            dimensions = int(index['dimensions'])
+            self._slots = OrderedDict(zip(index['keys'].tolist(), index['slots'].tolist()))
+        for key in self._touched:
+            if key in self._slots:
+                self._slots.move_to_end(key)
+        self._index_mtime = mtime
+        self._open_vectors(dimensions)
+
+    def _open_vectors(self, dimensions: int):
+        if self._vectors is not None and self.dimensions == dimensions:
+            return
+        expected_size = self.capacity * dimensions * np.dtype(np.float32).itemsize
+        if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) != expected_size:
+            # written with another capacity or model, start over
+            os.remove(self._vectors_path)
+            self._slots.clear()
+        mode = 'r+' if os.path.exists(self._vectors_path) else 'w+'
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode=mode,
+                                  shape=(self.capacity, dimensions))
+        self.dimensions = dimensions
+
+    def _save(self):
+        self._vectors.flush()
+        tmp_path = self._index_path + '.tmp.npz'
+        np.savez(tmp_path, dimensions=self.dimensions,
+                 keys=np.array(list(self._slots.keys()), dtype='S20'),
+                 slots=np.array(list(self._slots.values()), dtype=np.int64))
+        os.replace(tmp_path, self._index_path)
+        self._index_mtime = os.stat(self._index_path).st_mtime_ns
+        self._touched.clear()
+
+    def get(self, keys: Iterable[bytes]) -> Dict[bytes, np.ndarray]:
+        found = {}
+        with self._locked():
+            for key in keys:
+                slot = self._slots.get(key)
+                if slot is None:
+                    self.misses += 1
+                    continue
+                self.hits += 1
+                self._slots.move_to_end(key)
+                self._touched[key] = None
+                self._touched.move_to_end(key)
+                found[key] = np.array(self._vectors[slot])
+        return found
+
+    def put(self, vectors: Dict[bytes, np.ndarray]):
+        if not vectors:
+            return
+        with self._locked():
+            self._open_vectors(len(next(iter(vectors.values()))))
+            for key, vector in vectors.items():
+                if key in self._slots:
+                    slot = self._slots.pop(key)
+                elif len(self._slots) < self.capacity:
+                    slot = len(self._slots)
+                else:
+                    _, slot = self._slots.popitem(last=False)
+                self._slots[key] = slot
+                self._vectors[slot] = vector
+            self._save()
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._slots), 'capacity': self.capacity}
@@ -0,0 +1,154 @@
+from collections import Counter
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.marking.fuzzy import FuzzyMatcher
+
+
+SCORE_COLUMNS = ['assessment_id', 'question_id', 'student_id', 'score']
+
+
+def _lower(values: pd.Series) -> list:
+    return list(map(str.lower, values.fillna('').astype(str)))
+
+
+def _to_float(values: pd.Series) -> pd.Series:
+    try:
+        return values.astype(float)
+    except (TypeError, ValueError):
+        return pd.to_numeric(values.str.strip(), errors='coerce')
+
+
+def _scored(df: pd.DataFrame, score) -> pd.DataFrame:
+    return df.assign(score=score)[SCORE_COLUMNS]
+
+
+def mark_obj(df: pd.DataFrame) -> pd.DataFrame:
+    is_correct = df['ref_answer_id'].to_numpy() == df['stu_answer_id'].to_numpy()
+    return _scored(df, np.where(is_correct, df['mark'].to_numpy(), 0))
+
+
+def mark_sub_obj(df: pd.DataFrame, matcher: Optional[FuzzyMatcher] = None) -> pd.DataFrame:
+    if matcher is not None:
+        found = matcher.match_many(df['stu_answer'].to_numpy(), df['ref_answer'].to_numpy())
+    else:
+        # student answer must be a (case insensitive) substring of the reference
+        found = np.fromiter(map(str.__contains__, _lower(df['ref_answer']),
+                                _lower(df['stu_answer'])),
+                            dtype=bool, count=len(df))
+    is_correct = found & df['stu_answer'].notna().to_numpy()
+    return _scored(df, np.where(is_correct, df['mark'].to_numpy(), 0))
+
+
+def mark_maths(df: pd.DataFrame) -> pd.DataFrame:
+    stu_answer = _to_float(df['stu_answer'])
+    ref_answer = _to_float(df['ref_answer'])
+    tolerance = df['tolerance'].fillna(0).astype(float)
+    # answers that cannot be parsed as numbers compare as NaN and score 0
+    is_correct = ((stu_answer >= ref_answer - tolerance) &
+                  (stu_answer <= ref_answer + tolerance)).to_numpy()
+    return _scored(df, np.where(is_correct, df['mark'].to_numpy(), 0))
+
+
+def _question_student_index(df: pd.DataFrame, students: Optional[Sequence[str]] = None) -> pd.MultiIndex:
+    # every student is scored on every question, answered or not
+    if students is None:
+        students = df['student_id'].unique()
+    return pd.MultiIndex.from_product(
+        [df['question_id'].unique(), students],
+        names=['question_id', 'student_id'])
+
+
+def _first_per_question(df: pd.DataFrame, column: str, index: pd.MultiIndex) -> np.ndarray:
+    values = df.groupby('question_id', sort=False, observed=True)[column].first()
+    return values.reindex(index.get_level_values('question_id')).to_numpy()
+
+
+def _scores_frame(df: pd.DataFrame, index: pd.MultiIndex, score) -> pd.DataFrame:
+    return pd.DataFrame({
+        'assessment_id': df['assessment_id'].iloc[0],
+        'question_id': index.get_level_values('question_id'),
+        'student_id': index.get_level_values('student_id'),
+        'score': score,
+    })
+
+
+def mark_multi_obj(df: pd.DataFrame, students: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    # a student scores the mark only when the set of selected options equals
+    # the set of correct options: same size and every selection is correct
+    selected = df[['question_id', 'student_id', 'stu_answer_id']].drop_duplicates()
+    correct = df[['question_id', 'ref_answer_id']].drop_duplicates()
+    is_match = pd.MultiIndex.from_frame(selected[['question_id', 'stu_answer_id']]).isin(
+        pd.MultiIndex.from_frame(correct))
+    counts = selected.assign(matched=is_match).groupby(
+        ['question_id', 'student_id'], sort=False, observed=True)['matched'].agg(['size', 'sum'])
+
+    index = _question_student_index(df, students)
+    counts = counts.reindex(index, fill_value=0)
+    num_correct = correct.groupby('question_id', sort=False, observed=True).size().reindex(
+        index.get_level_values('question_id')).to_numpy()
+    is_correct = ((counts['size'].to_numpy() == num_correct) &
+                  (counts['sum'].to_numpy() == counts['size'].to_numpy()))
+    return _scores_frame(df, index, is_correct * _first_per_question(df, 'mark', index))
+
+
+class ReferenceIndex:
+    """Counts the reference answers of a question that contain a given text.
+
+    Short references are indexed by every substring so a lookup is a single
+    dict access; longer ones fall back to a scan.
+    """
+    MAX_INDEXED_LENGTH = 64
+
+    def __init__(self, references: Iterable[str]):
+        self.size = 0
+        self.substrings: Counter = Counter()
+        self.unindexed = []
+        for reference in references:
+            reference = reference.lower()
+            self.size += 1
+            if len(reference) > self.MAX_INDEXED_LENGTH:
+                self.unindexed.append(reference)
+                continue
+            self.substrings.update({reference[i:j] for i in range(len(reference))
+                                    for j in range(i + 1, len(reference) + 1)})
+
+    def count(self, answer: str) -> int:
+        if not answer:
+            # the empty string is a substring of every reference
+            return self.size
+        return self.substrings[answer] + sum(answer in reference for reference in self.unindexed)
+
+
+def _reference_indexes(df: pd.DataFrame) -> Dict[str, ReferenceIndex]:
+    references = df[['question_id', 'ref_answer']].drop_duplicates()
+    return {question_id: ReferenceIndex(group.dropna())
+            for question_id, group in references.groupby('question_id', sort=False, observed=True)['ref_answer']}
+
+
+def mark_multiple_sub(df: pd.DataFrame, students: Optional[Sequence[str]] = None,
+                      matcher: Optional[FuzzyMatcher] = None) -> pd.DataFrame:
+    # each distinct answer of a student scores one point per reference answer
+    # containing it (or matching it, given a matcher), the sum is then scaled
+    # by mark / num_answer
+    answers = df[['question_id', 'student_id', 'stu_answer']].drop_duplicates().dropna()
+    if matcher is not None:
+        references = {question_id: list(group.dropna().unique()) for question_id, group
+                      in df.groupby('question_id', sort=False, observed=True)['ref_answer']}
+        matches = [matcher.count(answer, references[question_id]) for question_id, answer
+                   in zip(answers['question_id'], answers['stu_answer'])]
+    else:
+        indexes = _reference_indexes(df)
+        matches = [indexes[question_id].count(answer.lower()) for question_id, answer
+                   in zip(answers['question_id'], answers['stu_answer'])]
+    sum_score = pd.Series(matches, index=pd.MultiIndex.from_frame(
+        answers[['question_id', 'student_id']]), dtype=float).groupby(level=[0, 1], sort=False, observed=True).sum()
+
+    index = _question_student_index(df, students)
+    sum_score = sum_score.reindex(index, fill_value=0).to_numpy()
+    mark = _first_per_question(df, 'mark', index)
+    num_answer = _first_per_question(df.assign(num_answer=df['num_answer'].fillna(1)),
+                                     'num_answer', index)
+    return _scores_frame(df, index, sum_score * mark / num_answer.astype(float))
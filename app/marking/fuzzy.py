@@ -0,0 +1,124 @@
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+NON_WORD = re.compile(r'[^\w\s]|_')
+
+
+def normalize(text: Optional[str]) -> str:
+    """Case folded, accents stripped, punctuation turned to spaces and whitespace collapsed."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(NON_WORD.sub(' ', text.casefold()).split())
+
+
+def bounded_levenshtein(a: str, b: str, limit: int) -> int:
+    """Edit distance of ``a`` and ``b``, or ``limit + 1`` as soon as it must exceed ``limit``.
+
+    Only the diagonal band of width ``2 * limit + 1`` is computed.
+    """
+    m, n = len(a), len(b)
+    over = limit + 1
+    if abs(m - n) > limit:
+        return over
+    previous = [j if j <= limit else over for j in range(n + 1)]
+    for i in range(1, m + 1):
+        current = [over] * (n + 1)
+        current[0] = i if i <= limit else over
+        row_min = current[0]
+        char = a[i - 1]
+        for j in range(max(1, i - limit), min(n, i + limit) + 1):
+            cost = previous[j - 1] + (char != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost if cost < over else over
+            if cost < row_min:
+                row_min = cost
+        if row_min > limit:
+            return over
+        previous = current
+    return previous[n]
+
+
+class FuzzyReference:
+    """A reference answer normalized once, with its runs of consecutive words."""
+
+    def __init__(self, reference: Optional[str]):
+        self.text = normalize(reference)
+        self.words = self.text.split()
+        self.word_set = set(self.words)
+        self._windows: Dict[int, List[str]] = {}
+
+    def windows(self, size: int) -> List[str]:
+        if size not in self._windows:
+            self._windows[size] = [' '.join(self.words[start:start + size])
+                                   for start in range(len(self.words) - size + 1)]
+        return self._windows[size]
+
+
+class FuzzyMatcher:
+    """Decides whether a sub_obj answer matches a reference answer despite small slips.
+
+    After normalization an answer matches when it is part of the reference,
+    when all its words appear in the reference in any order, or when it is
+    within a few edits of the reference or of a run of its words of about
+    the same length. One edit is allowed per ``chars_per_edit`` characters
+    of the answer, up to ``max_edits``. Results are memoized, a matcher is
+    meant to live for one marking run.
+    """
+
+    def __init__(self, max_edits: int = 2, chars_per_edit: int = 4):
+        self.max_edits = max_edits
+        self.chars_per_edit = chars_per_edit
+        self._answers: Dict[Optional[str], str] = {}
+        self._references: Dict[Optional[str], FuzzyReference] = {}
+        self._results: Dict[Tuple[str, str], bool] = {}
+
+    def _answer(self, answer: Optional[str]) -> str:
+        if answer not in self._answers:
+            self._answers[answer] = normalize(answer)
+        return self._answers[answer]
+
+    def _reference(self, reference: Optional[str]) -> FuzzyReference:
+        if reference not in self._references:
+            self._references[reference] = FuzzyReference(reference)
+        return self._references[reference]
+
+    def _matches(self, answer: str, reference: FuzzyReference) -> bool:
+        if not answer or not reference.text:
+            return False
+        if answer in reference.text:
+            return True
+        words = answer.split()
+        if reference.word_set.issuperset(words):
+            return True
+        limit = min(self.max_edits, len(answer) // self.chars_per_edit)
+        if limit == 0:
+            return False
+        # a slip can merge or split words, so runs one word shorter or longer count too
+        for size in range(max(1, len(words) - 1), len(words) + 2):
+            for window in reference.windows(size):
+                if bounded_levenshtein(answer, window, limit) <= limit:
+                    return True
+        return False
+
+    def matches(self, answer: Optional[str], reference: Optional[str]) -> bool:
+        answer = self._answer(answer)
+        fuzzy_reference = self._reference(reference)
+        key = (answer, fuzzy_reference.text)
+        if key not in self._results:
+            self._results[key] = self._matches(answer, fuzzy_reference)
+        return self._results[key]
+
+    def match_many(self, answers: Iterable[Optional[str]], references: Iterable[Optional[str]]) -> np.ndarray:
+        return np.fromiter((self.matches(answer, reference) for answer, reference in zip(answers, references)),
+                           dtype=bool)
+
+    def count(self, answer: Optional[str], references: Iterable[Optional[str]]) -> int:
+        """References the answer matches, for questions accepting several answers."""
+        return sum(self.matches(answer, reference) for reference in references)
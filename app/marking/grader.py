@@ -0,0 +1,109 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app import config
+from app.marking.similarity import TOKEN_PATTERN
+
+
+# similarity from which an nlp answer earns the full mark, and half of it
+FULL_MARK_SIMILARITY = 0.7
+HALF_MARK_SIMILARITY = 0.4
+
+
+class Grader(ABC):
+    """Turns similarity scores of nlp answers into the share of the mark earned."""
+    name = 'base'
+
+    @abstractmethod
+    def grade(self, similarity: np.ndarray, references: Sequence[str],
+              answers: Sequence[str]) -> np.ndarray:
+        ...
+
+
+class ThresholdGrader(Grader):
+    """Full marks from FULL_MARK_SIMILARITY, half from HALF_MARK_SIMILARITY, none below."""
+    name = 'threshold'
+
+    def grade(self, similarity: np.ndarray, references: Sequence[str],
+              answers: Sequence[str]) -> np.ndarray:
+        return np.where(similarity >= FULL_MARK_SIMILARITY, 1.0,
+                        np.where(similarity >= HALF_MARK_SIMILARITY, 0.5, 0.0))
+
+
+def _tokens(text: Optional[str]) -> list:
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+def features(similarity: np.ndarray, references: Sequence[str], answers: Sequence[str]) -> np.ndarray:
+    """One row per answer: similarity, length ratio and keyword overlap with the reference."""
+    matrix = np.empty((len(similarity), 3), dtype=np.float64)
+    matrix[:, 0] = similarity
+    for row, (reference, answer) in enumerate(zip(references, answers)):
+        reference_tokens = _tokens(reference)
+        answer_tokens = _tokens(answer)
+        matrix[row, 1] = len(answer_tokens) / max(len(reference_tokens), 1)
+        # words of four letters or more stand in for the reference's keywords
+        keywords = {token for token in reference_tokens if len(token) > 3}
+        matrix[row, 2] = len(keywords.intersection(answer_tokens)) / max(len(keywords), 1)
+    return matrix
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def load_model():
+    """The pickled classifier at config.ML_MODEL_PATH, loaded once per process.
+
+    Loading it before the server forks its workers lets them share the
+    model's pages instead of each holding a copy.
+    """
+    global _model
+    with _model_lock:
+        if _model is None:
+            try:
+                import joblib
+                _model = joblib.load(config.ML_MODEL_PATH)
+            except ImportError as e:
+                raise RuntimeError("the 'lightgbm' grader needs the joblib and lightgbm "
+                                   "packages installed") from e
+            except FileNotFoundError as e:
+                raise RuntimeError(f"no grader model at {config.ML_MODEL_PATH}, "
+                                   f"download {config.MODEL_NAME} there first") from e
+    return _model
+
+
+class LightGBMGrader(Grader):
+    """The LightGBM classifier at config.ML_MODEL_PATH.
+
+    Its classes are read as grades from 0 up to the highest class, which
+    earns the full mark. Blank answers earn nothing whatever it predicts.
+    """
+    name = 'lightgbm'
+
+    def grade(self, similarity: np.ndarray, references: Sequence[str],
+              answers: Sequence[str]) -> np.ndarray:
+        if len(similarity) == 0:
+            return np.zeros(0)
+        model = load_model()
+        grades = np.asarray(model.predict(features(similarity, references, answers)), dtype=np.float64)
+        credit = grades / float(np.max(model.classes_))
+        is_blank = np.fromiter((not (answer or '').strip() for answer in answers),
+                               dtype=bool, count=len(credit))
+        return np.where(is_blank, 0.0, credit)
+
+
+GRADERS = {
+    ThresholdGrader.name: ThresholdGrader,
+    LightGBMGrader.name: LightGBMGrader,
+}
+
+
+def get_grader(name: Optional[str] = None) -> Grader:
+    name = name or ThresholdGrader.name
+    if name not in GRADERS:
+        raise ValueError(f"unknown grader {name!r}, expected one of {sorted(GRADERS)}")
+    return GRADERS[name]()
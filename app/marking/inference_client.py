@@ -0,0 +1,100 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app import config
+
+
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+
+class InferenceError(Exception):
+    pass
+
+
+class InferenceClient:
+    """Sentence-similarity calls to the hosted inference API.
+
+    Requests share one pooled session and at most ``max_concurrency`` are in
+    flight at a time. Sentences are packed ``batch_size`` to a call, and 503
+    "model is loading" answers are retried with exponential backoff.
+    """
+
+    def __init__(self, url: str, headers: dict, max_concurrency: int = 4,
+                 batch_size: int = 64, timeout: float = 30, max_retries: int = 5,
+                 backoff: float = 1.0, max_backoff: float = 30):
+        self.url = url
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency,
+                                           thread_name_prefix='inference')
+
+    def _wait(self, attempt: int, response=None) -> float:
+        wait = self.backoff * 2 ** attempt
+        if response is not None:
+            try:
+                # the hosted API says how long a cold model needs to load
+                wait = max(wait, float(response.json().get('estimated_time', 0)))
+            except (ValueError, AttributeError):
+                pass
+        return min(wait, self.max_backoff)
+
+    def post(self, payload: dict):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise InferenceError(f"inference request failed: {e}") from e
+                time.sleep(self._wait(attempt))
+                continue
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                time.sleep(self._wait(attempt, response))
+                continue
+            if response.status_code != 200:
+                raise InferenceError(f"inference request failed with "
+                                     f"{response.status_code}: {response.text[:200]}")
+            return response.json()
+
+    def _similarity_call(self, reference: str, sentences: List[str]) -> List[float]:
+        return self.post({
+            "inputs": {
+                "source_sentence": reference,
+                "sentences": sentences
+            }
+        })
+
+    def similarity_many(self, pairs: Sequence[Tuple[str, List[str]]]) -> List[List[float]]:
+        """Scores every (reference, answers) pair, all calls running concurrently."""
+        futures = []
+        for reference, answers in pairs:
+            futures.append([self.executor.submit(self._similarity_call, reference,
+                                                 answers[start:start + self.batch_size])
+                            for start in range(0, len(answers), self.batch_size)])
+        return [[score for future in chunks for score in future.result()]
+                for chunks in futures]
+
+    def similarity(self, reference: str, answers: List[str]) -> List[float]:
+        return self.similarity_many([(reference, answers)])[0]
+
+
+@lru_cache(maxsize=None)
+def get_client() -> InferenceClient:
+    settings = config.settings
+    return InferenceClient(config.API_URL, config.headers,
+                           max_concurrency=settings.inference_concurrency,
+                           batch_size=settings.inference_batch_size,
+                           timeout=settings.inference_timeout,
+                           max_retries=settings.inference_max_retries)
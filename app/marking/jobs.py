@@ -0,0 +1,188 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from nanoid import generate
+
+from app.config import settings
+from app.database import SessionLocal
+from app.marking import answer_key
+from app.marking.metrics import MarkingReport
+from app.marking.pipeline import Progress, mark_new_submissions, run_marking
+
+
+logger = logging.getLogger(__name__)
+
+# finished jobs are reported for this long before they are forgotten
+JOB_RETENTION = timedelta(hours=24)
+
+
+class MarkingJob(Progress):
+    """A marking run of one assessment executed off the request thread."""
+
+    def __init__(self, assessment_id: str, unscored_only: bool = False,
+                 question_ids: Optional[List[str]] = None):
+        self.id = generate(size=15)
+        self.assessment_id = assessment_id
+        self.unscored_only = unscored_only
+        self.question_ids = question_ids
+        self.status = 'queued'
+        self.stage: Optional[str] = None
+        self.rows_total = 0
+        self.rows_processed = 0
+        # the answer key version the run marks with, known once it is fetched
+        self.key_version: Optional[int] = None
+        self.error: Optional[str] = None
+        self.rows_saved: Optional[Dict[str, int]] = None
+        self.report = MarkingReport()
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    def set_stage(self, stage: str, rows_total: Optional[int] = None):
+        self.stage = stage
+        if rows_total is not None:
+            self.rows_total = rows_total
+
+    def advance(self, rows: int):
+        self.rows_processed += rows
+
+    def set_key_version(self, version: int):
+        self.key_version = version
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    @property
+    def timings(self) -> Dict[str, Dict[str, float]]:
+        return self.report.as_dict()
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        if self.status != 'running' or not self.rows_processed or not self.rows_total:
+            return None
+        elapsed = (datetime.now() - self.started_at).total_seconds()
+        remaining = max(self.rows_total - self.rows_processed, 0)
+        return round(elapsed / self.rows_processed * remaining, 1)
+
+
+_executor = ThreadPoolExecutor(max_workers=settings.marking_workers,
+                               thread_name_prefix='marking')
+_lock = threading.Lock()
+_jobs: Dict[str, MarkingJob] = {}
+_active: Dict[str, MarkingJob] = {}
+# runs of an assessment waiting for its active one, in order
+_queued: Dict[str, List[MarkingJob]] = {}
+# students whose submissions are waiting for incremental marking, per assessment
+_pending: Dict[str, Set[str]] = {}
+
+
+def _run(job: MarkingJob):
+    job.status = 'running'
+    job.started_at = datetime.now()
+    db = SessionLocal()
+    try:
+        job.rows_saved = run_marking(db, job.assessment_id, job, unscored_only=job.unscored_only,
+                                     report=job.report, question_ids=job.question_ids)
+        job.status = 'completed'
+    except Exception as e:
+        logger.exception("marking job %s for assessment %s failed", job.id, job.assessment_id)
+        job.status = 'failed'
+        job.error = str(e)
+    finally:
+        db.close()
+        job.finished_at = datetime.now()
+        with _lock:
+            waiting = _queued.get(job.assessment_id, [])
+            following = waiting.pop(0) if waiting else None
+            if not waiting:
+                _queued.pop(job.assessment_id, None)
+            if following is not None:
+                _active[job.assessment_id] = following
+            else:
+                _active.pop(job.assessment_id, None)
+        if following is not None:
+            _executor.submit(_run, following)
+
+
+def _forget_old_jobs():
+    cutoff = datetime.now() - JOB_RETENTION
+    for job_id in [job.id for job in _jobs.values()
+                   if job.finished_at and job.finished_at < cutoff]:
+        del _jobs[job_id]
+
+
+def _covers(job: MarkingJob, unscored_only: bool, question_ids: Optional[List[str]],
+            key_version: Optional[int]) -> bool:
+    """Whether ``job`` marks everything a run of the given scope would."""
+    if job.question_ids is not None and (question_ids is None or not set(question_ids) <= set(job.question_ids)):
+        return False
+    if job.unscored_only and not unscored_only:
+        return False
+    if job.status != 'running':
+        # a queued run reads the key and the submissions when it starts
+        return True
+    # the closing pass is for submissions a running job may already have read past,
+    # a re-mark after a key edit for answers it scored with the old key
+    return not unscored_only and job.key_version in (None, key_version)
+
+
+def _current_key_version(assessment_id: str) -> Optional[int]:
+    db = SessionLocal()
+    try:
+        return answer_key.current_version(db, assessment_id)
+    finally:
+        db.close()
+
+
+def submit(assessment_id: str, unscored_only: bool = False,
+           question_ids: Optional[List[str]] = None) -> MarkingJob:
+    """Starts a marking run, or queues it behind the assessment's active one.
+
+    A request an active or queued run already covers gets that run back.
+    """
+    key_version = _current_key_version(assessment_id)
+    with _lock:
+        for job in [_active.get(assessment_id), *_queued.get(assessment_id, [])]:
+            if job is not None and _covers(job, unscored_only, question_ids, key_version):
+                return job
+        _forget_old_jobs()
+        job = MarkingJob(assessment_id, unscored_only, question_ids)
+        _jobs[job.id] = job
+        # one run per assessment at a time
+        if assessment_id in _active:
+            _queued.setdefault(assessment_id, []).append(job)
+            return job
+        _active[assessment_id] = job
+    _executor.submit(_run, job)
+    return job
+
+
+def get(job_id: str) -> Optional[MarkingJob]:
+    return _jobs.get(job_id)
+
+
+def _mark_pending(assessment_id: str):
+    with _lock:
+        student_ids = _pending.pop(assessment_id, set())
+    db = SessionLocal()
+    try:
+        mark_new_submissions(db, assessment_id, student_ids)
+    except Exception:
+        # the closing pass picks up whatever is still unscored
+        logger.exception("incremental marking of assessment %s failed", assessment_id)
+    finally:
+        db.close()
+
+
+def enqueue_submission(assessment_id: str, student_id: str):
+    # submissions arriving while a batch is queued join that batch
+    with _lock:
+        waiting = _pending.setdefault(assessment_id, set())
+        schedule = not waiting
+        waiting.add(student_id)
+    if schedule:
+        _executor.submit(_mark_pending, assessment_id)
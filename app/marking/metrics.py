@@ -0,0 +1,93 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple, TypeVar
+
+from app.marking.similarity import SimilarityBackend
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class StageStats:
+    __slots__ = ('seconds', 'rows', 'calls', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.rows = 0
+        self.calls = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {'seconds': round(self.seconds, 3), 'rows': self.rows, 'calls': self.calls,
+                'cache_hits': self.cache_hits, 'cache_misses': self.cache_misses}
+
+
+class MarkingReport:
+    """Time and counters of each stage of a marking run.
+
+    A stage entered several times, once per chunk say, accumulates. The
+    ``similarity`` stage is the model calls made inside the nlp stages and
+    its time is also part of theirs.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageStats]:
+        stats = self.stages.setdefault(name, StageStats())
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds += time.perf_counter() - start
+
+    def timed(self, name: str, frames: Iterable[T]) -> Iterator[T]:
+        # only the time spent producing each frame counts towards the stage
+        frames = iter(frames)
+        while True:
+            with self.stage(name) as stats:
+                frame = next(frames, None)
+                if frame is None:
+                    return
+                stats.rows += len(frame)
+            yield frame
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        return {name: stats.as_dict() for name, stats in self.stages.items()}
+
+    def emit(self, assessment_id: str):
+        for name, stats in self.stages.items():
+            logger.info("marking_stage assessment=%s stage=%s seconds=%.3f rows=%d calls=%d "
+                        "cache_hits=%d cache_misses=%d", assessment_id, name, stats.seconds,
+                        stats.rows, stats.calls, stats.cache_hits, stats.cache_misses)
+
+
+class MeteredBackend(SimilarityBackend):
+    """Records the model calls of a similarity backend in a report."""
+
+    def __init__(self, backend: SimilarityBackend, report: MarkingReport):
+        self.backend = backend
+        self.report = report
+        self.name = backend.name
+
+    def similarity_many(self, pairs: Sequence[Tuple[str, List[str]]]) -> List[List[float]]:
+        # the embedding cache is shared, its counters are read either side
+        store = getattr(self.backend, 'store', None)
+        before = store.stats() if store is not None else None
+        with self.report.stage('similarity') as stats:
+            scores = self.backend.similarity_many(pairs)
+            stats.calls += 1
+            stats.rows += sum(len(answers) for _, answers in pairs)
+            if before is not None:
+                after = store.stats()
+                stats.cache_hits += after['hits'] - before['hits']
+                stats.cache_misses += after['misses'] - before['misses']
+        return scores
+
+    def similarity(self, reference: str, answers: List[str]) -> List[float]:
+        return self.similarity_many([(reference, answers)])[0]
@@ -0,0 +1,120 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.marking.grader import Grader, get_grader
+from app.marking.similarity import SimilarityBackend, get_backend, normalize_text
+
+
+def dedupe_similarity(backend: SimilarityBackend,
+                      pairs: Sequence[Tuple[str, List[str]]]) -> List[List[float]]:
+    # answers equal after case and whitespace normalization are scored once
+    # per reference and blank answers score 0 without reaching the model
+    normalized = [[normalize_text(answer) for answer in answers] for _, answers in pairs]
+    unique_pairs = []
+    for (reference, answers), texts in zip(pairs, normalized):
+        unique = {}
+        for answer, text in zip(answers, texts):
+            if text and text not in unique:
+                unique[text] = answer.strip()
+        unique_pairs.append((reference, unique))
+    to_score = [i for i, (_, unique) in enumerate(unique_pairs) if unique]
+    scored = backend.similarity_many([(unique_pairs[i][0], list(unique_pairs[i][1].values()))
+                                      for i in to_score])
+    scored = dict(zip(to_score, scored))
+    results = []
+    for i, texts in enumerate(normalized):
+        scores = dict(zip(unique_pairs[i][1], scored.get(i, [])))
+        results.append([scores.get(text, 0.0) for text in texts])
+    return results
+
+
+def _question_rows(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    # positions of each question's rows, in order of first appearance
+    return df.groupby('question_id', sort=False, observed=True).indices
+
+
+def _score_rows(backend: SimilarityBackend, answers: np.ndarray,
+                batches: List[Tuple[str, np.ndarray]]) -> np.ndarray:
+    """Similarity of the answers at each batch's rows to its reference, the
+    batches laid end to end in one preallocated array."""
+    all_scores = dedupe_similarity(backend, [(reference, answers[rows].tolist())
+                                             for reference, rows in batches])
+    scores = np.empty(sum(len(rows) for _, rows in batches))
+    offset = 0
+    for batch_scores in all_scores:
+        scores[offset:offset + len(batch_scores)] = batch_scores
+        offset += len(batch_scores)
+    return scores
+
+
+def mark_multiple_nlp(df: pd.DataFrame, backend: Optional[SimilarityBackend] = None,
+                      students: Optional[Sequence[str]] = None, grader: Optional[Grader] = None):
+    # every answer of a question is scored against each of its reference
+    # answers, in one call for every reference answer of every question
+    backend = backend or get_backend()
+    grader = grader or get_grader()
+    references = df['ref_answer'].to_numpy()
+    batches = [(reference, rows) for rows in _question_rows(df).values()
+               for reference in pd.unique(references[rows])]
+    answers = df['stu_answer'].to_numpy()
+    scores = _score_rows(backend, answers, batches)
+    rows = np.concatenate([rows for _, rows in batches])
+    credit = grader.grade(scores, [reference for reference, rows in batches for _ in rows], answers[rows])
+    nlp_df = pd.DataFrame({
+        'question_id': df['question_id'].to_numpy()[rows],
+        'student_id': df['student_id'].to_numpy()[rows],
+        'num_answer': df['num_answer'].to_numpy()[rows],
+        'mark': df['mark'].to_numpy()[rows],
+        'score': credit,
+    })
+    return process_multi_nlp(nlp_df, df['assessment_id'].iloc[0], students)
+
+
+def process_multi_nlp(df: pd.DataFrame, assessment_id, students: Optional[Sequence[str]] = None):
+    # a student scores the sum of their num_answer best matches, scaled by
+    # mark / num_answer, and 0 on questions they did not answer; like
+    # engine.mark_multiple_sub a missing num_answer counts as 1
+    first = df.assign(num_answer=df['num_answer'].fillna(1)).groupby(
+        'question_id', sort=False)[['num_answer', 'mark']].first()
+    ranked = df.sort_values(['question_id', 'student_id', 'score'],
+                            ascending=[True, True, False], kind='stable')
+    rank = ranked.groupby(['question_id', 'student_id'], sort=False).cumcount().to_numpy()
+    best = ranked[rank < ranked['question_id'].map(first['num_answer']).to_numpy(dtype=float)]
+    top_sum = best.groupby(['question_id', 'student_id'], sort=False)['score'].sum()
+
+    users = df['student_id'].unique() if students is None else list(students)
+    index = pd.MultiIndex.from_product([first.index, users], names=['question_id', 'student_id'])
+    top_sum = top_sum.reindex(index, fill_value=0).to_numpy()
+    num_answer = first['num_answer'].reindex(index.get_level_values('question_id')).to_numpy(dtype=float)
+    mark = first['mark'].reindex(index.get_level_values('question_id')).to_numpy()
+    return pd.DataFrame({
+        'assessment_id': assessment_id,
+        'question_id': index.get_level_values('question_id'),
+        'student_id': index.get_level_values('student_id'),
+        'score': top_sum / num_answer * mark,
+    })
+
+
+def mark_single_nlp(df: pd.DataFrame, backend: Optional[SimilarityBackend] = None,
+                    grader: Optional[Grader] = None):
+    # the answers of a question are scored against its first reference answer
+    backend = backend or get_backend()
+    grader = grader or get_grader()
+    references = df['ref_answer'].to_numpy()
+    batches = [(references[rows[0]], rows) for rows in _question_rows(df).values()]
+    answers = df['stu_answer'].to_numpy()
+    scores = np.empty(len(df))
+    row_references = np.empty(len(df), dtype=object)
+    scores[np.concatenate([rows for _, rows in batches])] = _score_rows(backend, answers, batches)
+    for reference, rows in batches:
+        row_references[rows] = reference
+    credit = grader.grade(scores, row_references, answers)
+    return df.assign(score=credit * df['mark'].to_numpy())[
+        ['assessment_id', 'question_id', 'student_id', 'score']]
+
+
+def predict_nlp(ref_answer: str, stu_answers: List[str], backend: Optional[SimilarityBackend] = None):
+    backend = backend or get_backend()
+    return dedupe_similarity(backend, [(ref_answer, stu_answers)])[0]
@@ -0,0 +1,51 @@
+from typing import List
+
+import pandas as pd
+from nanoid import generate
+from sqlalchemy import Numeric, cast, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app import models
+
+
+# 5 bound parameters per row, well under PostgreSQL's 65535 limit
+CHUNK_SIZE = 5000
+
+
+def _upsert(db: Session, table, rows: List[dict], conflict_columns: List[str],
+            update_column: str, chunk_size: int) -> int:
+    count = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        for row in chunk:
+            row['id'] = generate(size=15)
+        stmt = insert(table).values(chunk)
+        stmt = stmt.on_conflict_do_update(index_elements=conflict_columns,
+                                          set_={update_column: stmt.excluded[update_column]})
+        count += db.execute(stmt).rowcount
+    return count
+
+
+def upsert_scores(db: Session, score_df: pd.DataFrame, chunk_size: int = CHUNK_SIZE) -> int:
+    rows = score_df[['assessment_id', 'student_id', 'question_id', 'score']].to_dict('records')
+    return _upsert(db, models.Score.__table__, rows,
+                   ['assessment_id', 'student_id', 'question_id'], 'score', chunk_size)
+
+
+def recompute_totals(db: Session, assessment_id: str, assessment_mark: int) -> int:
+    """Rebuilds the totals of an assessment from its stored scores in one statement."""
+    score = models.Score
+    total_question_mark = select(func.sum(models.Question.mark)).where(
+        models.Question.assessment_id == assessment_id).scalar_subquery()
+    totals = select(
+        # derived from the key so re-running never changes a total's id
+        func.substr(func.md5(score.assessment_id + ':' + score.student_id), 1, 15),
+        score.assessment_id, score.student_id,
+        func.round(cast(func.sum(score.score) * assessment_mark / total_question_mark, Numeric), 2)
+    ).where(score.assessment_id == assessment_id).group_by(score.assessment_id, score.student_id)
+    stmt = insert(models.Total.__table__).from_select(
+        ['id', 'assessment_id', 'student_id', 'total'], totals)
+    stmt = stmt.on_conflict_do_update(index_elements=['assessment_id', 'student_id'],
+                                      set_={'total': stmt.excluded.total})
+    return db.execute(stmt).rowcount
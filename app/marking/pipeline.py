@@ -0,0 +1,348 @@
+from concurrent.futures import Executor
+from contextlib import nullcontext
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.marking import answer_key, engine, nlp, persistence, sharding
+from app.marking.answer_key import AnswerKey
+from app.marking.fuzzy import FuzzyMatcher
+from app.marking.grader import Grader, get_grader
+from app.marking.metrics import MarkingReport, MeteredBackend
+from app.marking.similarity import get_backend
+
+
+SUBMISSION_COLUMNS = ['assessment_id', 'question_id', 'mark', 'question_type', 'is_multi_choice', 'tolerance',
+                      'num_answer', 'ref_answer_id', 'ref_answer', 'student_id', 'stu_answer', 'stu_answer_id']
+
+# what is read from submissions, the rest comes from the answer key
+SUBMITTED_COLUMNS = ['question_id', 'student_id', 'stu_answer', 'stu_answer_id']
+
+SUBMITTED_QUERY_COLUMNS = (models.Submission.question_id, models.Submission.student_id,
+                           models.Submission.stu_answer, models.Submission.stu_answer_id)
+
+# (stage, question_type, is_multi_choice, marker); None matches either
+MARKERS = [
+    ('obj', 'obj', False, engine.mark_obj),
+    ('multi_obj', 'obj', True, engine.mark_multi_obj),
+    ('sub_obj', 'sub_obj', False, engine.mark_sub_obj),
+    ('multi_sub_obj', 'sub_obj', True, engine.mark_multiple_sub),
+    ('maths', 'maths', None, engine.mark_maths),
+    ('nlp', 'nlp', False, nlp.mark_single_nlp),
+    ('multi_nlp', 'nlp', True, nlp.mark_multiple_nlp),
+]
+
+# cheap enough to mark the moment a submission arrives, nlp waits for a batch
+DETERMINISTIC_TYPES = ('obj', 'sub_obj', 'maths')
+
+# markers that score every student of the stage on every question
+PER_STUDENT_MARKERS = (engine.mark_multi_obj, engine.mark_multiple_sub, nlp.mark_multiple_nlp)
+
+# below this many submission rows process start-up costs more than it saves
+SHARD_MIN_ROWS = 100_000
+
+# repeated on every row of a submission frame
+CATEGORY_COLUMNS = ['assessment_id', 'question_id', 'question_type', 'ref_answer_id',
+                    'student_id', 'stu_answer_id']
+
+# rows pulled from the server-side cursor per round trip
+FETCH_BATCH_SIZE = 10_000
+
+
+class Progress:
+    """Receives progress updates from the marking pipeline, ignored by default."""
+
+    def set_stage(self, stage: str, rows_total: Optional[int] = None):
+        pass
+
+    def advance(self, rows: int):
+        pass
+
+    def set_key_version(self, version: int):
+        pass
+
+
+def _submission_query(db: Session, assessment_id: str, columns, question_ids: Optional[Iterable[str]] = None,
+                      student_ids: Optional[Iterable[str]] = None, unscored_only: bool = False):
+    query = db.query(*columns).filter(models.Submission.assessment_id == assessment_id)
+    if question_ids is not None:
+        query = query.filter(models.Submission.question_id.in_(list(question_ids)))
+    if student_ids is not None:
+        query = query.filter(models.Submission.student_id.in_(list(student_ids)))
+    if unscored_only:
+        query = query.outerjoin(models.Score, and_(
+            models.Score.assessment_id == models.Submission.assessment_id,
+            models.Score.student_id == models.Submission.student_id,
+            models.Score.question_id == models.Submission.question_id)
+        ).filter(models.Score.id.is_(None))
+    return query
+
+
+def _submission_frame(rows, key: AnswerKey) -> pd.DataFrame:
+    # each submission meets every correct option of its question, as the
+    # join with options used to produce. Ids repeat on every row, as
+    # categories each is stored once.
+    submitted = pd.DataFrame.from_records(rows, columns=SUBMITTED_COLUMNS)
+    return submitted.merge(key.rows, on='question_id')[SUBMISSION_COLUMNS].astype(
+        {column: 'category' for column in CATEGORY_COLUMNS})
+
+
+def fetch_submissions(db: Session, key: AnswerKey, student_ids: Optional[Iterable[str]] = None,
+                      question_types: Optional[Iterable[str]] = None,
+                      question_ids: Optional[Iterable[str]] = None,
+                      unscored_only: bool = False) -> pd.DataFrame:
+    if question_types is not None:
+        question_ids = [question_id for question_type in question_types
+                        for question_id in key.question_ids(question_type)
+                        if question_ids is None or question_id in question_ids]
+    query = _submission_query(db, key.assessment_id, SUBMITTED_QUERY_COLUMNS, question_ids,
+                              student_ids, unscored_only)
+    return _submission_frame(query.all(), key)
+
+
+def count_submissions(db: Session, key: AnswerKey, unscored_only: bool = False,
+                      question_ids: Optional[Iterable[str]] = None) -> int:
+    """Rows the submissions of an assessment expand to, one per correct option."""
+    query = _submission_query(db, key.assessment_id,
+                              [models.Submission.question_id, func.count()], question_ids,
+                              unscored_only=unscored_only).group_by(models.Submission.question_id)
+    return sum(count * key.correct_counts.get(question_id, 0) for question_id, count in query)
+
+
+def iter_submissions(db: Session, key: AnswerKey, chunk_rows: int, unscored_only: bool = False,
+                     question_ids: Optional[Iterable[str]] = None) -> Iterator[pd.DataFrame]:
+    """Streams the submissions of an assessment in frames of about ``chunk_rows``.
+
+    Rows are read through a server-side cursor ordered by question and a
+    frame only ever ends on a question boundary, so every question is
+    marked from a single frame.
+    """
+    query = _submission_query(db, key.assessment_id, SUBMITTED_QUERY_COLUMNS, question_ids,
+                              unscored_only=unscored_only)
+    rows = []
+    size = 0
+    for row in query.order_by(models.Submission.question_id).yield_per(FETCH_BATCH_SIZE):
+        if size >= chunk_rows and row[0] != rows[-1][0]:
+            yield _submission_frame(rows, key)
+            rows = []
+            size = 0
+        rows.append(row)
+        size += key.correct_counts.get(row[0], 0)
+    if rows:
+        yield _submission_frame(rows, key)
+
+
+def fetch_stage_students(db: Session, key: AnswerKey,
+                         unscored_only: bool = False) -> Dict[str, List[str]]:
+    """Students of each stage whose marker scores every student on every question."""
+    students = {}
+    for stage, question_type, is_multi_choice, marker in MARKERS:
+        question_ids = key.question_ids(question_type, is_multi_choice)
+        if marker not in PER_STUDENT_MARKERS or not question_ids:
+            continue
+        query = _submission_query(db, key.assessment_id, [models.Submission.student_id],
+                                  question_ids, unscored_only=unscored_only).distinct()
+        students[stage] = [student_id for student_id, in query]
+    return students
+
+
+def stage_frames(sub_df: pd.DataFrame):
+    for stage, question_type, is_multi_choice, marker in MARKERS:
+        selected = sub_df.question_type == question_type
+        if is_multi_choice is not None:
+            selected &= sub_df.is_multi_choice == is_multi_choice
+        df = sub_df[selected]
+        if len(df) > 0:
+            yield stage, question_type, marker, df
+
+
+def sub_obj_matcher() -> Optional[FuzzyMatcher]:
+    """The matcher settings.sub_obj_matching asks for, None keeps the plain substring test."""
+    if settings.sub_obj_matching == 'substring':
+        return None
+    if settings.sub_obj_matching == 'fuzzy':
+        return FuzzyMatcher(settings.fuzzy_max_edits, settings.fuzzy_chars_per_edit)
+    raise ValueError(f"unknown sub_obj_matching {settings.sub_obj_matching!r}, "
+                     f"expected 'substring' or 'fuzzy'")
+
+
+def mark_submissions(sub_df: pd.DataFrame, progress: Optional[Progress] = None,
+                     students: Optional[Dict[str, Sequence[str]]] = None,
+                     executor: Optional[Executor] = None,
+                     report: Optional[MarkingReport] = None,
+                     grader: Optional[Grader] = None) -> pd.DataFrame:
+    """Scores a frame of submissions.
+
+    ``students`` holds the students of stages whose markers score every
+    student, when the frame does not carry all of them. Deterministic
+    stages of a large frame are sharded over ``executor`` when given.
+    """
+    progress = progress or Progress()
+    students = students or {}
+    report = report or MarkingReport()
+    matcher = sub_obj_matcher()
+    score_dfs = [pd.DataFrame(columns=engine.SCORE_COLUMNS)]
+    stages = list(stage_frames(sub_df))
+    if executor is not None and len(sub_df) >= SHARD_MIN_ROWS:
+        # deterministic markers are CPU bound and run in worker processes,
+        # nlp stays here where the similarity backend already batches
+        sharded = []
+        for stage, question_type, marker, df in stages:
+            if question_type not in DETERMINISTIC_TYPES:
+                continue
+            kwargs = {}
+            if marker in PER_STUDENT_MARKERS:
+                kwargs['students'] = students.get(stage, df['student_id'].unique())
+            if question_type == 'sub_obj' and matcher is not None:
+                kwargs['matcher'] = matcher
+            sharded.append((marker, df, kwargs))
+        if sharded:
+            progress.set_stage('sharded')
+            with report.stage('mark.sharded') as stats:
+                score_dfs += sharding.mark_sharded(executor, sharded, settings.marking_processes)
+                stats.rows += sum(len(df) for _, df, _ in sharded)
+            progress.advance(sum(len(df) for _, df, _ in sharded))
+        stages = [stage for stage in stages if stage[1] not in DETERMINISTIC_TYPES]
+    for stage, question_type, marker, df in stages:
+        progress.set_stage(stage)
+        kwargs = {}
+        if stage in students and marker in PER_STUDENT_MARKERS:
+            kwargs['students'] = students[stage]
+        if question_type == 'sub_obj' and matcher is not None:
+            kwargs['matcher'] = matcher
+        if question_type not in DETERMINISTIC_TYPES:
+            kwargs['backend'] = MeteredBackend(get_backend(), report)
+            kwargs['grader'] = grader
+        with report.stage('mark.' + stage) as stats:
+            score_dfs.append(marker(df, **kwargs))
+            stats.rows += len(df)
+        progress.advance(len(df))
+    # markers may hand back categories in any order, plain strings sort the
+    # same however the work was split
+    score_df = pd.concat(score_dfs, axis=0).astype(
+        {'assessment_id': object, 'question_id': object, 'student_id': object})
+    # a single answer question with several accepted options yields one row
+    # per option, the student keeps the best of them
+    return score_df.groupby(['assessment_id', 'question_id', 'student_id'],
+                            as_index=False, sort=True)['score'].max()
+
+
+def compute_totals(score_df: pd.DataFrame, assessment_mark: int, total_question_mark: float) -> pd.DataFrame:
+    total_df = score_df.groupby(['assessment_id', 'student_id'], as_index=False)[
+        'score'].sum()
+    total_df['total'] = (
+        (total_df['score'] * assessment_mark)/total_question_mark).round(2)
+    return total_df[['assessment_id', 'student_id', 'total']]
+
+
+def complete_marking(db: Session, assessment: models.Assessment, finalize: bool = True) -> int:
+    # totals are rebuilt from every stored score so earlier incremental
+    # marks count too
+    count = persistence.recompute_totals(db, assessment.id, assessment.total_mark)
+    if finalize:
+        db.query(models.Assessment).filter(models.Assessment.id == assessment.id).update(
+            {"is_marked": True, "is_active": False, "is_completed": True}, synchronize_session=False)
+    db.commit()
+    return count
+
+
+def run_marking(db: Session, assessment_id: str, progress: Optional[Progress] = None,
+                unscored_only: bool = False, report: Optional[MarkingReport] = None,
+                question_ids: Optional[Sequence[str]] = None) -> Dict[str, int]:
+    """Marks an assessment, or re-marks only ``question_ids`` of it.
+
+    A selective re-mark upserts the scores of those questions and rebuilds
+    the totals, leaving every other score and the assessment's state alone.
+    """
+    progress = progress or Progress()
+    report = report or MarkingReport()
+    assessment = db.query(models.Assessment).filter(
+        models.Assessment.id == assessment_id).first()
+
+    progress.set_stage('fetch')
+    with report.stage('fetch'):
+        key = answer_key.get(db, assessment_id)
+        progress.set_key_version(key.version)
+        grader = get_grader(assessment.grader)
+        students = fetch_stage_students(db, key, unscored_only)
+        rows_total = count_submissions(db, key, unscored_only, question_ids)
+    progress.set_stage('mark', rows_total=rows_total)
+    scores = 0
+    workers = settings.marking_processes
+    with (sharding.process_pool(workers) if workers > 1 else nullcontext()) as executor:
+        # each chunk is marked and its scores written before the next is read,
+        # re-marking overwrites the stored scores in place
+        chunks = iter_submissions(db, key, settings.marking_chunk_rows, unscored_only, question_ids)
+        for sub_df in report.timed('fetch', chunks):
+            score_df = mark_submissions(sub_df, progress, students, executor, report, grader)
+            with report.stage('save.scores') as stats:
+                count = persistence.upsert_scores(db, score_df)
+                stats.rows += count
+            scores += count
+
+    progress.set_stage('save')
+    with report.stage('save.totals') as stats:
+        totals = complete_marking(db, assessment, finalize=question_ids is None)
+        stats.rows += totals
+    report.emit(assessment_id)
+    return {'scores': scores, 'totals': totals}
+
+
+def mark_new_submissions(db: Session, assessment_id: str, student_ids: Iterable[str]) -> int:
+    """Scores the deterministic questions of freshly submitted students."""
+    sub_df = fetch_submissions(db, answer_key.get(db, assessment_id), student_ids=student_ids,
+                               question_types=DETERMINISTIC_TYPES)
+    count = persistence.upsert_scores(db, mark_submissions(sub_df))
+    db.commit()
+    return count
+
+
+def diff_marks(db: Session, assessment: models.Assessment, question_ids: Sequence[str]) -> dict:
+    """Re-scores the given questions in memory and compares them with what is stored.
+
+    Nothing is written. Scores stored for other questions count towards
+    the new totals unchanged, as they would after a real re-mark.
+    """
+    key = answer_key.get(db, assessment.id)
+    sub_df = fetch_submissions(db, key, question_ids=question_ids)
+    new_df = mark_submissions(sub_df, students=fetch_stage_students(db, key),
+                              grader=get_grader(assessment.grader))[
+        ['student_id', 'question_id', 'score']]
+    stored_df = pd.DataFrame.from_records(
+        db.query(models.Score.student_id, models.Score.question_id, models.Score.score).filter(
+            models.Score.assessment_id == assessment.id).all(),
+        columns=['student_id', 'question_id', 'score'])
+
+    scores = new_df.merge(stored_df, on=['student_id', 'question_id'], how='left',
+                          suffixes=('', '_stored'))
+    scores = scores[scores['score_stored'].isna() |
+                    ~np.isclose(scores['score'], scores['score_stored'].fillna(0))]
+
+    marked_df = pd.concat([stored_df, new_df]).drop_duplicates(
+        ['student_id', 'question_id'], keep='last').assign(assessment_id=assessment.id)
+    totals = compute_totals(marked_df, assessment.total_mark, key.total_question_mark).merge(
+        pd.DataFrame.from_records(
+            db.query(models.Total.student_id, models.Total.total).filter(
+                models.Total.assessment_id == assessment.id).all(),
+            columns=['student_id', 'total_stored']),
+        on='student_id', how='left')
+    totals = totals[totals['total_stored'].isna() |
+                    ~np.isclose(totals['total'], totals['total_stored'].fillna(0))]
+    return {
+        'assessment_id': assessment.id,
+        'question_ids': list(question_ids),
+        'students_affected': int(pd.concat([scores['student_id'], totals['student_id']]).nunique()),
+        'scores': [{'student_id': student_id, 'question_id': question_id,
+                    'stored_score': None if pd.isna(stored) else stored, 'new_score': score}
+                   for student_id, question_id, score, stored in scores[
+                       ['student_id', 'question_id', 'score', 'score_stored']].itertuples(index=False)],
+        'totals': [{'student_id': student_id, 'stored_total': None if pd.isna(stored) else stored,
+                    'new_total': total, 'delta': round(total - (0 if pd.isna(stored) else stored), 2)}
+                   for student_id, total, stored in totals[
+                       ['student_id', 'total', 'total_stored']].itertuples(index=False)],
+    }
@@ -0,0 +1,33 @@
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import pandas as pd
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def _mark_shard(marker: Callable, df: pd.DataFrame, kwargs: Dict[str, Any]) -> pd.DataFrame:
+    return marker(df, **kwargs)
+
+
+def shard_by_question(df: pd.DataFrame, shards: int) -> List[pd.DataFrame]:
+    codes = pd.factorize(df['question_id'])[0] % shards
+    return [shard for _, shard in df.groupby(codes, sort=True)]
+
+
+def mark_sharded(executor: Executor, stages: Sequence[Tuple[Callable, pd.DataFrame, Dict[str, Any]]],
+                 shards: int) -> List[pd.DataFrame]:
+    """Marks each (marker, frame, keyword arguments) split by question over a process pool.
+
+    Markers scoring every student on every question must be given the whole
+    stage's students, not just those who answered a shard's questions.
+    Results come back in stage then shard order whatever order the workers
+    finish in.
+    """
+    futures = [executor.submit(_mark_shard, marker, shard, kwargs)
+               for marker, df, kwargs in stages
+               for shard in shard_by_question(df, shards)]
+    return [future.result() for future in futures]
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app import config
+from app.marking.embedding_cache import EmbeddingStore, cache_key
+from app.marking.inference_client import get_client
+
+
+class SimilarityBackend(ABC):
+    """Scores student answers against a reference answer, 1.0 being identical."""
+    name = 'base'
+
+    @abstractmethod
+    def similarity(self, reference: str, answers: List[str]) -> List[float]:
+        ...
+
+    def similarity_many(self, pairs: Sequence[Tuple[str, List[str]]]) -> List[List[float]]:
+        return [self.similarity(reference, answers) for reference, answers in pairs]
+
+
+class HttpSimilarityBackend(SimilarityBackend):
+    """The hosted HuggingFace sentence-similarity endpoint (config.API_URL)."""
+    name = 'http'
+
+    def similarity(self, reference: str, answers: List[str]) -> List[float]:
+        return get_client().similarity(reference, answers)
+
+    def similarity_many(self, pairs: Sequence[Tuple[str, List[str]]]) -> List[List[float]]:
+        return get_client().similarity_many(pairs)
+
+
+class EmbeddingBackend(SimilarityBackend):
+    """Cosine similarity of sentence embeddings computed in process."""
+    model_name = ''
+
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        ...
+
+    def similarity(self, reference: str, answers: List[str]) -> List[float]:
+        return self.similarity_many([(reference, answers)])[0]
+
+    def similarity_many(self, pairs: Sequence[Tuple[str, List[str]]]) -> List[List[float]]:
+        # every distinct text across all pairs is encoded once, in one batch
+        positions = {}
+        for reference, answers in pairs:
+            for text in [reference, *answers]:
+                positions.setdefault(text or '', len(positions))
+        if not positions:
+            return [[] for _ in pairs]
+        vectors = self.encode(list(positions))
+        return [(vectors[[positions[answer or ''] for answer in answers]]
+                 @ vectors[positions[reference or '']]).tolist()
+                for reference, answers in pairs]
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+@lru_cache(maxsize=None)
+def _load_sentence_transformer(model_name: str):
+    # loaded once per worker process and kept for its lifetime
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError as e:
+        raise RuntimeError("the 'local' similarity backend needs the "
+                           "sentence-transformers package installed") from e
+    return SentenceTransformer(model_name, device='cpu')
+
+
+class LocalSimilarityBackend(EmbeddingBackend):
+    """A sentence-transformers model running on the worker's CPU."""
+    name = 'local'
+
+    def __init__(self, model_name: Optional[str] = None, batch_size: int = 64):
+        self.model_name = model_name or config.TRANSFORMER_MODEL_NAME
+        self.batch_size = batch_size
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        model = _load_sentence_transformer(self.model_name)
+        vectors = model.encode(list(texts), batch_size=self.batch_size,
+                               convert_to_numpy=True, show_progress_bar=False)
+        return _normalize_rows(vectors.astype(np.float32))
+
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def normalize_text(text: Optional[str]) -> str:
+    return ' '.join((text or '').lower().split())
+
+
+class CachedEmbeddingBackend(EmbeddingBackend):
+    """Serves embeddings from an EmbeddingStore and only encodes the misses."""
+
+    def __init__(self, backend: EmbeddingBackend, store: EmbeddingStore):
+        self.backend = backend
+        self.store = store
+        self.name = backend.name
+        self.model_name = backend.model_name
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        texts = [normalize_text(text) for text in texts]
+        keys = [cache_key(self.model_name, text) for text in texts]
+        found = self.store.get(set(keys))
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            computed = dict(zip(missing, self.backend.encode(list(missing.values()))))
+            self.store.put(computed)
+            found.update(computed)
+        return np.stack([found[key] for key in keys])
+
+
+class StubSimilarityBackend(EmbeddingBackend):
+    """Deterministic hashed bag-of-words embeddings for tests and benchmarks."""
+    name = 'stub'
+    model_name = 'stub-hashed-bow'
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in TOKEN_PATTERN.findall((text or '').lower()):
+                digest = hashlib.blake2b(token.encode(), digest_size=4).digest()
+                vectors[row, int.from_bytes(digest, 'little') % self.dimensions] += 1
+        return _normalize_rows(vectors)
+
+
+BACKENDS = {
+    HttpSimilarityBackend.name: HttpSimilarityBackend,
+    LocalSimilarityBackend.name: LocalSimilarityBackend,
+    StubSimilarityBackend.name: StubSimilarityBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_backend(name: Optional[str] = None) -> SimilarityBackend:
+    name = name or config.settings.similarity_backend
+    if name not in BACKENDS:
+        raise ValueError(f"unknown similarity backend {name!r}, "
+                         f"expected one of {sorted(BACKENDS)}")
+    backend = BACKENDS[name]()
+    if isinstance(backend, LocalSimilarityBackend) and config.settings.embedding_cache:
+        directory = os.path.join(config.EMBEDDING_CACHE_DIR,
+                                 re.sub(r'[^\w.-]', '_', backend.model_name))
+        backend = CachedEmbeddingBackend(backend, EmbeddingStore(directory, config.EMBEDDING_CACHE_SIZE))
+    return backend
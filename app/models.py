@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Float, ForeignKey, Integer, String, DateTime, UniqueConstraint
+from sqlalchemy import JSON, Boolean, Column, Float, ForeignKey, Integer, String, DateTime, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -82,6 +82,10 @@ class Assessment(Base):
     is_active = Column(Boolean, server_default="FALSE", nullable=False)
     is_marked = Column(Boolean, server_default="FALSE", nullable=False)
     is_completed = Column(Boolean, server_default="FALSE", nullable=False)
+    # bumped whenever its questions or options change
+    key_version = Column(Integer, server_default="0", nullable=False)
+    # how nlp answers are graded, see app.marking.grader; NULL is 'threshold'
+    grader = Column(String, nullable=True)
     course_id = Column(String, ForeignKey(
         "courses.course_code", ondelete="CASCADE"), nullable=False)
 
@@ -143,6 +147,39 @@ class Submission(Base):
     stu_answer_id = Column(String, nullable=True)
 
 
+class SubmissionReceipt(Base):
+
+    __tablename__ = "submission_receipts"
+    id = Column(String, primary_key=True, index=True)
+    student_id = Column(String, ForeignKey(
+        "students.id", ondelete="CASCADE"), nullable=False)
+    assessment_id = Column(String, ForeignKey(
+        "assessments.id", ondelete="CASCADE"), nullable=False)
+    idempotency_key = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (UniqueConstraint('assessment_id', 'student_id', name='_receipt_assessment_student_uc'),
+                      )
+
+
+class Draft(Base):
+
+    __tablename__ = "drafts"
+    id = Column(String, primary_key=True, index=True)
+    student_id = Column(String, ForeignKey(
+        "students.id", ondelete="CASCADE"), nullable=False)
+    question_id = Column(String, ForeignKey(
+        "questions.id", ondelete="CASCADE"), nullable=False)
+    assessment_id = Column(String, ForeignKey(
+        "assessments.id", ondelete="CASCADE"), nullable=False)
+    # [{"stu_answer": ..., "stu_answer_id": ...}], one entry per selected option
+    answers = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (UniqueConstraint('assessment_id', 'student_id', 'question_id', name='_draft_assessment_student_question_uc'),
+                      )
+
+
 class Score(Base):
 
     __tablename__ = "scores"
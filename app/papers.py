@@ -0,0 +1,104 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session, joinedload
+
+from app import config, models, schemas
+from app.marking import answer_key
+
+
+# what a paper depends on besides its questions, read with every access check
+VERSION_COLUMNS = (models.Assessment.key_version, models.Assessment.is_active, models.Assessment.is_marked,
+                   models.Assessment.is_completed)
+
+Version = Tuple[int, bool, bool, bool]
+
+# the entity tags of an If-None-Match header, weak or strong
+ETAG_PATTERN = re.compile(r'(?:W/)?("[^"]*")')
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header lists ``etag``, compared weakly."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return ETAG_PATTERN.sub(r'\1', etag) in ETAG_PATTERN.findall(if_none_match)
+
+
+class Paper:
+    """The exam paper students are served, serialized once per version of the assessment.
+
+    ``closed_body`` is what a student who already submitted gets, the
+    paper without its questions.
+    """
+
+    def __init__(self, version: Version, body: bytes, closed_body: bytes):
+        self.version = version
+        self.body = body
+        self.etag = _etag(body)
+        self.closed_body = closed_body
+        self.closed_etag = _etag(closed_body)
+
+
+def compile_paper(db: Session, assessment_id: str, version: Version) -> Optional[Paper]:
+    assessment = db.query(models.Assessment).options(joinedload(models.Assessment.instructions)).filter(
+        models.Assessment.id == assessment_id).first()
+    if assessment is None:
+        return None
+    key = answer_key.get(db, assessment_id)
+    questions = [dict(question, answers=[{'id': option['id'], 'option': option['option']}
+                                         for option in key.options.get(question['id'], [])]
+                      if question['question_type'] == 'obj' else [])
+                 for question in key.questions]
+    paper = jsonable_encoder(schemas.AssessmentPaper(**dict(jsonable_encoder(assessment), questions=questions)))
+    return Paper(version, orjson.dumps(paper), orjson.dumps(dict(paper, questions=[])))
+
+
+_lock = threading.Lock()
+# one compile at a time, the students arriving meanwhile wait for its result
+_compile_lock = threading.Lock()
+_cache: 'OrderedDict[str, Paper]' = OrderedDict()
+
+
+def _cached(assessment_id: str, version: Version) -> Optional[Paper]:
+    with _lock:
+        paper = _cache.get(assessment_id)
+        if paper is not None and paper.version == version:
+            _cache.move_to_end(assessment_id)
+            return paper
+    return None
+
+
+def get(db: Session, assessment_id: str, version: Version) -> Optional[Paper]:
+    """The paper of an assessment at ``version``, compiled only when the version moved on."""
+    paper = _cached(assessment_id, version)
+    if paper is not None:
+        return paper
+    with _compile_lock:
+        paper = _cached(assessment_id, version)
+        if paper is not None:
+            return paper
+        paper = compile_paper(db, assessment_id, version)
+        if paper is None:
+            return None
+        with _lock:
+            _cache[assessment_id] = paper
+            _cache.move_to_end(assessment_id)
+            while len(_cache) > config.PAPER_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return paper
+
+
+def warm(db: Session, assessment_id: str) -> Optional[Paper]:
+    version = db.query(*VERSION_COLUMNS).filter(models.Assessment.id == assessment_id).first()
+    return get(db, assessment_id, tuple(version)) if version is not None else None
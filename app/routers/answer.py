@@ -3,10 +3,11 @@ from nanoid import generate
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from sqlalchemy import func
+from sqlalchemy import func, select
 # from sqlalchemy.sql.functions import func
 from .. import models, schemas, oauth2
 from ..database import get_db
+from ..marking import answer_key
 
 
 router = APIRouter(
@@ -14,6 +15,12 @@ router = APIRouter(
     tags=['Answers']
 )
 
+
+def option_assessment_id(id: str):
+    return select(models.Question.assessment_id).join(
+        models.Option, models.Option.question_id == models.Question.id).where(
+        models.Option.id == id).scalar_subquery()
+
 @router.post("/",)
 def create_options(answers:schemas.Options, user:schemas.TokenUser=Depends(oauth2.get_current_user),
                     db:Session=Depends(get_db)):
@@ -34,6 +41,7 @@ def create_options(answers:schemas.Options, user:schemas.TokenUser=Depends(oauth
         new_option = models.Option(**option.dict(), id=generate(size=15), question_id=answers.question_id)
         options.append(new_option)
     db.add_all(options)
+    answer_key.bump_version(db, question.assessment_id)
     db.commit()
     return Response(status_code=status.HTTP_201_CREATED)
 
@@ -44,7 +52,7 @@ def update_option(id: str, option:schemas.Option, user:schemas.TokenUser=Depends
     if not answer_query.first():
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="answer not found")
-    instructor = db.query(models.rOption).join(
+    instructor = db.query(models.Option).join(
         models.Question,models.Option.question_id == models.Question.id).join(
         models.Assessment, models.Question.assessment_id == models.Assessment.id).join(
         models.CourseInstructor, models.Assessment.course_id == models.CourseInstructor.course_code
@@ -54,6 +62,7 @@ def update_option(id: str, option:schemas.Option, user:schemas.TokenUser=Depends
     if not instructor:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
     answer_query.update(option.dict(), synchronize_session=False)
+    answer_key.bump_version(db, option_assessment_id(id))
     db.commit()
     return Response(status_code=status.HTTP_201_CREATED)
 
@@ -73,6 +82,7 @@ def delete_option(id: str, user:schemas.TokenUser=Depends(oauth2.get_current_use
              models.CourseInstructor.is_accepted == True).first()
     if not instructor:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    answer_key.bump_version(db, option_assessment_id(id))
     answer_query.delete(synchronize_session=False)
     db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
@@ -1,16 +1,17 @@
-from fastapi import FastAPI, Response, status, HTTPException, Depends, APIRouter
+from fastapi import FastAPI, Header, Response, status, HTTPException, Depends, APIRouter
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from sqlalchemy.orm import joinedload, subqueryload, contains_eager
 from nanoid import generate
 
-from sqlalchemy import Numeric, String, and_, cast, extract, func, or_
+from sqlalchemy import Numeric, String, and_, cast, extract, func, literal, or_
 # from sqlalchemy.sql.functions import func
-from .. import models, schemas, oauth2
+from .. import models, papers, schemas, oauth2
 from datetime import timedelta, datetime
 from ..database import get_db
 from ..config import settings
+from ..marking import answer_key, jobs
 from datetime import datetime
 from fastapi import BackgroundTasks
 
@@ -66,6 +67,7 @@ def update_assessment(updated_assessment: schemas.Assessment, id: str, db: Sessi
     
     assessment_query.update(updated_assessment.dict(),
                             synchronize_session=False)
+    answer_key.bump_version(db, id)
     db.commit()
     db.refresh(assessment_query.first())
     return assessment_query.first()
@@ -103,6 +105,7 @@ def edit_schedule(updated_assessment: schemas.AssessmentSchedule, id: str, db: S
         raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED, detail="End date/time should be later than start date/time.")
     
     assessment_query.update(updated_assessment.dict(), synchronize_session=False)
+    answer_key.bump_version(db, id)
     db.commit()
     db.refresh(assessment_query.first())
     return assessment_query.first()
@@ -135,6 +138,8 @@ def activate_assessment(id: str, db: Session = Depends(get_db),
     assessment_query.update({"is_active": True},
                             synchronize_session=False)
     db.commit()
+    # compiled now rather than by the first of the students arriving at the start
+    papers.warm(db, id)
     return
 
 @router.put("/{id}/deactivate", status_code=status.HTTP_201_CREATED)
@@ -165,10 +170,13 @@ def end_assessment_automatic(id: str, db: Session = Depends(get_db),
     if not assessment_query.first():
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assessment not found.")
     current_time = datetime.now()
+    closing = not assessment_query.first().is_completed and current_time >= assessment_query.first().end_date
     if current_time >= assessment_query.first().end_date:
         assessment_query.update({"is_active": False, "is_completed": True}, synchronize_session=False)
 
     db.commit()
+    if closing and settings.incremental_marking:
+        jobs.submit(id, unscored_only=True)
     return
 
 @router.put("/{id}/end-manual", status_code=status.HTTP_201_CREATED)
@@ -184,9 +192,12 @@ def end_assessment_automatic(id: str, db: Session = Depends(get_db),
     if assessment_query.first().start_date >= datetime.now():
         raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED, detail="Assessment cannot be ended until it has started.")
     
+    closing = not assessment_query.first().is_completed
     assessment_query.update({"is_active": False, "is_completed": True},
                             synchronize_session=False)
     db.commit()
+    if closing and settings.incremental_marking:
+        jobs.submit(id, unscored_only=True)
     return
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -240,61 +251,41 @@ def review_assessment(id: str, db: Session = Depends(get_db),
             raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED,
                                 detail="can only create an assignment to start at a time 1 hour ahead of {current_time}")
     assessment = db.query(models.Assessment).options(
-        joinedload(models.Assessment.instructions)).options(
-        joinedload(models.Assessment.questions)).options(
-        joinedload(models.Assessment.questions, models.Question.answers)).filter(
+        joinedload(models.Assessment.instructions)).filter(
         models.Assessment.id == id).first()
-    print(assessment)
     assessment_dict = jsonable_encoder(assessment)
+    assessment_dict['questions'] = answer_key.get(db, id).review_questions()
     return assessment_dict
 
 
-@router.get("/{id}/assessment_questions", response_model=schemas.AssessmentReview)
-def get_assessment_questions(id: str, db: Session = Depends(get_db),
+@router.get("/{id}/assessment_questions", response_model=schemas.AssessmentPaper)
+def get_assessment_questions(id: str, if_none_match: Optional[str] = Header(None),
+                             db: Session = Depends(get_db),
                              user: schemas.TokenUser = Depends(oauth2.get_current_user)):
-    assessment_query = db.query(models.Assessment).filter(
-        models.Assessment.id == id)
-    assessment_detail = assessment_query.first()
-    if not assessment_detail:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"assessment with id -> {id} not found")
+    # a single query checks access and reads the version of the cached paper
     if user.is_instructor:
-        instructor = db.query(models.Assessment).join(
+        access = db.query(*papers.VERSION_COLUMNS, literal(False)).join(
             models.CourseInstructor, models.Assessment.course_id == models.CourseInstructor.course_code
         ).filter(models.CourseInstructor.instructor_id == user.id, models.Assessment.id == id,
                  models.CourseInstructor.is_accepted == True).first()
-        if not instructor:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    if not user.is_instructor:
-        student = db.query(models.Assessment).join(
+    else:
+        submitted = db.query(models.SubmissionReceipt.id).filter(
+            models.SubmissionReceipt.assessment_id == id,
+            models.SubmissionReceipt.student_id == user.id).exists()
+        access = db.query(*papers.VERSION_COLUMNS, submitted).join(
             models.Enrollment, models.Assessment.course_id == models.Enrollment.course_code
         ).filter(models.Enrollment.reg_num == user.id, models.Assessment.id == id).first()
-        if not student:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-        # # only view question in period of exam
-        current_time = datetime.now()
-        submission = db.query(models.Submission).filter(models.Submission
-                                                        .assessment_id == id, models.Submission.student_id == user.id).first()
-        if submission:
-            assessment = db.query(models.Assessment).options(
-                joinedload(models.Assessment.instructions)).filter(
-                models.Assessment.id == id).first()
-            assessment.questions = []
-            assessment_dict = jsonable_encoder(assessment)
-
-            return assessment_dict
-            
-    assessment = db.query(models.Assessment).options(
-        joinedload(models.Assessment.instructions)).options(
-        joinedload(models.Assessment.questions)).options(
-        joinedload(models.Assessment.questions, models.Question.answers)).filter(
-        models.Assessment.id == id).first()
-    print(assessment)
-    assessment_dict = jsonable_encoder(assessment)
-    for i, question in enumerate(assessment_dict['questions']):
-        if not question['question_type'] == 'obj':
-            assessment_dict['questions'][i]['answers'] = []
-    return assessment_dict
+    if access is None:
+        if db.query(models.Assessment.id).filter(models.Assessment.id == id).first() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=f"assessment with id -> {id} not found")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    *version, has_submitted = access
+    paper = papers.get(db, id, tuple(version))
+    body, etag = (paper.closed_body, paper.closed_etag) if has_submitted else (paper.body, paper.etag)
+    if papers.etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 
 @router.get("/{id}/questions", response_model=schemas.AssessmentQuestion)
@@ -489,26 +480,26 @@ def get_assessment_results(id: str, reg_num: str, db: Session = Depends(get_db),
     scores = db.query(models.Score).filter(models.Score.assessment_id == id,
                                            models.Score.student_id == reg_num).all()
     assessment = db.query(models.Assessment).options(
-        joinedload(models.Assessment.instructions)).options(
-        joinedload(models.Assessment.questions)).options(
-        joinedload(models.Assessment.questions, models.Question.answers)).filter(
+        joinedload(models.Assessment.instructions)).filter(
         models.Assessment.id == id).first()
     total_dict = jsonable_encoder(total)
-    submissions_dict = jsonable_encoder(submissions)
-    score_dict = jsonable_encoder(scores)
     assessment_dict = jsonable_encoder(assessment)
-    for i, question in enumerate(assessment_dict['questions']):
-        answer_dic = {"stu_answer": 0, "stu_answer_id": 0}
-        for sub in submissions_dict:
-            if sub['question_id'] == question['id']:
+    assessment_dict['questions'] = answer_key.get(db, id).review_questions()
+    question_submissions = {}
+    for sub in submissions:
+        question_submissions.setdefault(sub.question_id, []).append(sub)
+    question_scores = {score.question_id: score.score for score in scores}
+    for question in assessment_dict['questions']:
+        if question['id'] in question_submissions:
+            answer_dic = {"stu_answer": 0, "stu_answer_id": 0}
+            for sub in question_submissions[question['id']]:
                 if not question['question_type'] == 'obj':
-                    answer_dic['stu_answer'] = sub['stu_answer']
+                    answer_dic['stu_answer'] = sub.stu_answer
                 else:
-                    answer_dic['stu_answer_id'] = sub['stu_answer_id']
-                assessment_dict['questions'][i]['stu_answers'] = answer_dic
-        for score in score_dict:
-            if score['question_id'] == question['id']:
-                assessment_dict['questions'][i]['stu_mark'] = score['score']
+                    answer_dic['stu_answer_id'] = sub.stu_answer_id
+            question['stu_answers'] = answer_dic
+        if question['id'] in question_scores:
+            question['stu_mark'] = question_scores[question['id']]
     assessment_dict['total'] = total_dict['total']
     return assessment_dict
 
@@ -4,9 +4,10 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from fastapi.encoders import jsonable_encoder
 
-from sqlalchemy import func
+from sqlalchemy import func, select
 # from sqlalchemy.sql.functions import func
 from .. import models, schemas, oauth2
+from ..marking import answer_key
 from ..database import get_db
 import pandas as pd
 import numpy as np
@@ -17,6 +18,10 @@ router = APIRouter(
     tags=['Instruction']
 )
 
+def instruction_assessment_id(id: str):
+    return select(models.Instruction.assessment_id).where(models.Instruction.id == id).scalar_subquery()
+
+
 @router.post("/")
 def create_instructions(instructions:schemas.Instructions, user:schemas.TokenUser=Depends(oauth2.get_current_user),
                     db:Session=Depends(get_db)):
@@ -36,6 +41,7 @@ def create_instructions(instructions:schemas.Instructions, user:schemas.TokenUse
         new_instruction = models.Instruction(instruction=instruction, assessment_id=instructions.assessment_id, id = generate(size=15))
         new_instructions.append(new_instruction)
     db.add_all(new_instructions)
+    answer_key.bump_version(db, instructions.assessment_id)
     db.commit()
     return Response(status_code=status.HTTP_201_CREATED)
 
@@ -66,6 +72,7 @@ def update_instruction(id: str, instruction:schemas.Instruction, user:schemas.To
     if not instructor:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
     instruction_query.update(instruction.dict(), synchronize_session=False)
+    answer_key.bump_version(db, instruction_assessment_id(id))
     db.commit()
     return Response(status_code=status.HTTP_201_CREATED)
 
@@ -84,6 +91,7 @@ def delete_instruction(id: str, user:schemas.TokenUser=Depends(oauth2.get_curren
         models.CourseInstructor.is_accepted == True).first()
     if not instructor:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    answer_key.bump_version(db, instruction_assessment_id(id))
     instruction_query.delete(synchronize_session=False)
     db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
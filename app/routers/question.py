@@ -7,6 +7,7 @@ from sqlalchemy import func
 # from sqlalchemy.sql.functions import func
 from .. import models, schemas, oauth2
 from ..database import get_db
+from ..marking import answer_key
 from datetime import timedelta, datetime
 
 
@@ -35,6 +36,7 @@ def create_question(question:schemas.Question, user:schemas.TokenUser=Depends(oa
     #                         detail="cannot add questions to already started assessment")
     new_question = models.Question(**question.dict(), id=generate(size=15))
     db.add(new_question)
+    answer_key.bump_version(db, question.assessment_id)
     db.commit()
     db.refresh(new_question)
     return new_question
@@ -61,6 +63,7 @@ def update_question(id: str, updated_question:schemas.QuestionUpdate, user:schem
     #     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
     #                         detail="cannot add questions to already started assessment")
     question_query.update(updated_question.dict(), synchronize_session=False)
+    answer_key.bump_version(db, question.assessment_id)
     db.commit()
     db.refresh(question_query.first())
     return question_query.first()
@@ -87,5 +90,6 @@ def delete_question(id: str,user:schemas.TokenUser=Depends(oauth2.get_current_us
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="cannot delete questions to already started assessment")
     question_query.delete(synchronize_session=False)
+    answer_key.bump_version(db, question.assessment_id)
     db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
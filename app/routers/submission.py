@@ -1,4 +1,5 @@
-from fastapi import FastAPI, Form, Response, status, HTTPException, Depends, APIRouter,  File, UploadFile
+from concurrent import futures
+from fastapi import FastAPI, Form, Header, Response, status, HTTPException, Depends, APIRouter,  File, UploadFile
 from nanoid import generate
 from sqlalchemy.orm import Session
 from typing import List, Optional
@@ -8,10 +9,10 @@ from datetime import datetime
 
 from sqlalchemy import func
 # from sqlalchemy.sql.functions import func
-from .. import models, schemas, oauth2
+from .. import drafts, models, schemas, oauth2, submission_writer
 from ..database import get_db
-import pandas as pd
-import numpy as np
+from ..config import settings
+from ..marking import answer_key, jobs
 
 
 router = APIRouter(
@@ -20,55 +21,95 @@ router = APIRouter(
 )
 
 
+def is_eligible(db: Session, assessment_id: str, student_id: str) -> bool:
+    return db.query(models.Assessment.id).join(
+        models.Enrollment, models.Assessment.course_id == models.Enrollment.course_code
+    ).filter(models.Assessment.id == assessment_id, models.Enrollment.reg_num == student_id).first() is not None
+
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
 def make_submission(submissions: schemas.Submissions,
+                    idempotency_key: Optional[str] = Header(None),
                     user: schemas.TokenUser = Depends(oauth2.get_current_user),
                     db: Session = Depends(get_db)):
-    is_eligible = db.query(models.Assessment).join(
+    # the statement promotes the stored draft, answers saved since and sent now replace its answers
+    unflushed = drafts.buffer.take(submissions.assessment_id, user.id)
+    answers = dict(unflushed)
+    submitted = {}
+    for answer in submissions.submissions:
+        submitted.setdefault(answer.question_id, []).append(
+            {'stu_answer': answer.stu_answer, 'stu_answer_id': answer.stu_answer_id})
+    answers.update(submitted)
+    # answers without a selected option carry the '-1' the markers expect
+    pending = submission_writer.PendingSubmission(submissions.assessment_id, user.id, [
+        {'id': generate(size=15), 'student_id': user.id, 'assessment_id': submissions.assessment_id,
+         'question_id': question_id, 'stu_answer': answer.get('stu_answer'),
+         'stu_answer_id': answer['stu_answer_id'] if answer.get('stu_answer_id') is not None else '-1'}
+        for question_id, question_answers in answers.items() for answer in question_answers],
+        idempotency_key)
+    try:
+        if settings.group_commit:
+            try:
+                outcome = submission_writer.writer.write(pending, timeout=settings.group_commit_timeout)
+            except futures.TimeoutError:
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    detail="Submission not confirmed in time, try again")
+        else:
+            # eligibility, answers, end time and draft removal in one statement
+            outcome, = submission_writer.insert_submissions(db, [pending])
+            db.commit()
+    except Exception:
+        # kept for the student's retry
+        drafts.buffer.put(submissions.assessment_id, user.id, unflushed)
+        raise
+    if outcome == submission_writer.INELIGIBLE:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    if outcome == submission_writer.CONFLICT:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="A different submission was already made for this assessment")
+    if outcome == submission_writer.CREATED and settings.incremental_marking:
+        jobs.enqueue_submission(submissions.assessment_id, user.id)
+    # a retry gets the response of the submission it repeats
+    return Response(status_code=status.HTTP_201_CREATED)
+
+
+@router.put("/draft/{assessment_id}", status_code=status.HTTP_204_NO_CONTENT)
+def save_draft(assessment_id: str, draft: schemas.Draft,
+               user: schemas.TokenUser = Depends(oauth2.get_current_user),
+               db: Session = Depends(get_db)):
+    submitted = db.query(models.SubmissionReceipt.id).filter(
+        models.SubmissionReceipt.assessment_id == models.Assessment.id,
+        models.SubmissionReceipt.student_id == user.id).exists()
+    access = db.query(models.Assessment.id, submitted.label('submitted')).join(
         models.Enrollment, models.Assessment.course_id == models.Enrollment.course_code
-    ).filter(models.Assessment.id == submissions.assessment_id, models.Enrollment.reg_num == user.id).count() > 0
-    if not is_eligible:
+    ).filter(models.Assessment.id == assessment_id, models.Enrollment.reg_num == user.id).first()
+    if access is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    # assessment_questions = db.query(models.Assessment.id, models.Question.id, models.Option.id).join(
-    #     models.Question, models.Assessment.id == models.Question.assessment_id).join(
-    #     models.Option, models.Question.id == models.Option.question_id).filter(
-    #     models.Option.is_correct == True, models.Assessment.id == submissions.assessment_id).all()
-    # assessment_df = pd.DataFrame.from_records(assessment_questions,
-    #                                             columns=['assessment_id', 'question_id', 'Option_id'])
+    if access.submitted:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="The assessment was already submitted")
+    key = answer_key.get(db, assessment_id)
+    unknown = sorted({answer.question_id for answer in draft.answers} - key.by_id.keys())
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"Questions not in this assessment: {', '.join(unknown)}")
+    drafts.buffer.put(assessment_id, user.id, {
+        answer.question_id: [option.dict() for option in answer.answers] for answer in draft.answers})
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-    # print(assessment_df.shape)
-    # stu_ans_df: pd.DataFrame= pd.DataFrame(jsonable_encoder(submissions.submissions),)
-    # print(stu_ans_df.shape)
-    print("health check")
-    sub_query = db.query(models.Submission).filter(models.Submission.assessment_id == submissions.assessment_id,
-                                                   models.Submission.student_id == user.id)
-    if sub_query.first() != None:
-        return Response(status_code=status.HTTP_201_CREATED)
-    
-    submission_df: pd.DataFrame = pd.DataFrame(
-        jsonable_encoder(submissions.submissions),)
-    print(submission_df)
-    # submission_df.rename(columns={"Option_id":"ref_answer_id"}, inplace=True)
-    submission_df['stu_answer_id'].replace(
-        np.NaN, -1, inplace=True)  # to change column back to int
-    submission_df['stu_answer_id'] = submission_df['stu_answer_id'].astype(int)
-    print(submission_df.shape)
-    print("here")
-    print(submission_df.stu_answer_id.values)
-    responses = submission_df.to_dict('records')
-    print(len(responses))
-    stu_subs = []
-    for response in responses:
-        # print(response['stu_answer_id'])
-        submission = models.Submission(
-            **response, id=generate(size=15), student_id=user.id, assessment_id=submissions.assessment_id)
-        stu_subs.append(submission)
 
-    assessment_times = db.query(models.AssessmentTimeRecords).filter(models.AssessmentTimeRecords.assessment_id == submissions.assessment_id, models.AssessmentTimeRecords.student_id == user.id).first()
+@router.get("/draft/{assessment_id}", response_model=schemas.Draft)
+def get_draft(assessment_id: str,
+              user: schemas.TokenUser = Depends(oauth2.get_current_user),
+              db: Session = Depends(get_db)):
+    if not is_eligible(db, assessment_id, user.id):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return {"answers": [{"question_id": question_id, "answers": answers}
+                        for question_id, answers in drafts.load(db, assessment_id, user.id).items()]}
 
-    assessment_times.end_datetime = datetime.now()
 
-    db.add_all(stu_subs)
-    db.commit()
-    db.refresh(assessment_times)
-    return Response(status_code=status.HTTP_201_CREATED)
+@router.get("/writer")
+def writer_stats(user: schemas.TokenUser = Depends(oauth2.get_current_user)):
+    if not user.is_instructor:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return {"group_commit": settings.group_commit, **submission_writer.writer.stats.as_dict()}
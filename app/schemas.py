@@ -1,4 +1,4 @@
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, EmailStr, StrictInt, ValidationError, conint, validator, constr
 from datetime import timedelta, datetime
@@ -143,6 +143,7 @@ class Assessment(BaseModel):
     is_marked: bool = False
     assessment_type: Literal['Assignment', 'Test', 'Exam']
     end_date: datetime
+    grader: Optional[Literal['threshold', 'lightgbm']] = None
 
     # @validator('start_date')
     # def check_start(cls, v):
@@ -246,7 +247,18 @@ class SubmissionUpdate(BaseModel):
 
 class Submissions(BaseModel):
     assessment_id: str
-    submissions: List[Submission]
+    # questions left out are taken from the student's draft
+    submissions: List[Submission] = []
+
+
+class DraftAnswer(BaseModel):
+    question_id: str
+    # one entry per selected option, empty to clear the question's answer
+    answers: List[SubmissionUpdate] = []
+
+
+class Draft(BaseModel):
+    answers: List[DraftAnswer]
 
 
 class QuestionAnswer(QuestionOut):
@@ -270,6 +282,22 @@ class AssessmentReview(Assessment):
     instructions: Optional[List[InstructionOut]] = None
 
 
+class PaperOption(BaseModel):
+    id: str
+    option: str
+
+
+class PaperQuestion(QuestionOut):
+    # options of obj questions only, without their is_correct flags
+    answers: List[PaperOption] = []
+
+
+class AssessmentPaper(Assessment):
+    id: str
+    questions: Optional[List[PaperQuestion]] = None
+    instructions: Optional[List[InstructionOut]] = None
+
+
 class StuAssessmentReview(Assessment):
     id: str
     questions: Optional[List[ReviewQuestionAnswer]] = None
@@ -300,3 +328,50 @@ class AssessmentResultsStats(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class MarkingJobOut(BaseModel):
+    id: str
+    assessment_id: str
+    status: Literal['queued', 'running', 'completed', 'failed']
+    stage: Optional[str] = None
+    rows_total: int
+    rows_processed: int
+    eta_seconds: Optional[float] = None
+    error: Optional[str] = None
+    question_ids: Optional[List[str]] = None
+    key_version: Optional[int] = None
+    rows_saved: Optional[Dict[str, int]] = None
+    timings: Dict[str, Dict[str, float]] = {}
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+
+class MarkingQuestions(BaseModel):
+    question_ids: List[str]
+
+
+class ScoreChange(BaseModel):
+    student_id: str
+    question_id: str
+    stored_score: Optional[float] = None
+    new_score: float
+
+
+class TotalChange(BaseModel):
+    student_id: str
+    stored_total: Optional[float] = None
+    new_total: float
+    delta: float
+
+
+class MarkingDiff(BaseModel):
+    assessment_id: str
+    question_ids: List[str]
+    students_affected: int
+    scores: List[ScoreChange]
+    totals: List[TotalChange]
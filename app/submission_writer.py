@@ -0,0 +1,252 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from nanoid import generate
+from sqlalchemy import DateTime, String, cast, column, delete, func, literal, select, true, union_all, update, values
+from sqlalchemy.dialects.postgresql import JSON, insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+
+
+logger = logging.getLogger(__name__)
+
+# what became of a submission
+CREATED = 'created'
+# submitted before, under the same idempotency key or without one
+DUPLICATE = 'duplicate'
+# submitted before under another idempotency key
+CONFLICT = 'conflict'
+INELIGIBLE = 'ineligible'
+
+
+class PendingSubmission:
+    """The answer rows of one student's submission and when it arrived."""
+    __slots__ = ('assessment_id', 'student_id', 'rows', 'idempotency_key', 'submitted_at', 'future')
+
+    def __init__(self, assessment_id: str, student_id: str, rows: List[dict],
+                 idempotency_key: Optional[str] = None):
+        self.assessment_id = assessment_id
+        self.student_id = student_id
+        self.rows = rows
+        self.idempotency_key = idempotency_key
+        self.submitted_at = datetime.now()
+        self.future: Future = Future()
+
+
+def submit_statement(submission: PendingSubmission):
+    """One statement that stores a submission unless the student may not or already did.
+
+    The eligibility check, the receipt claiming the (assessment, student)
+    pair, the answers, the promotion of the saved draft, the end time and
+    the draft removal are CTEs of a single query, so a retry costs one
+    round trip. The row it returns
+    tells whether the student is eligible, whether this call stored the
+    submission, and the idempotency key of an earlier one.
+    """
+    assessment_id, student_id = submission.assessment_id, submission.student_id
+    receipts = models.SubmissionReceipt.__table__
+    # core columns throughout, an ORM select would leave the write CTEs out
+    assessments, enrollments = models.Assessment.__table__, models.Enrollment.__table__
+    eligible = select(assessments.c.id).join(
+        enrollments, assessments.c.course_id == enrollments.c.course_code).where(
+        assessments.c.id == assessment_id, enrollments.c.reg_num == student_id).exists()
+    receipt = insert(receipts).from_select(
+        ['id', 'assessment_id', 'student_id', 'idempotency_key', 'created_at'],
+        select(literal(generate(size=15), String), literal(assessment_id, String), literal(student_id, String),
+               literal(submission.idempotency_key, String), literal(submission.submitted_at, DateTime)
+               ).where(eligible)
+    ).on_conflict_do_nothing(index_elements=['assessment_id', 'student_id']).returning(receipts.c.id).cte('receipt')
+    accepted = select(receipt.c.id).exists()
+
+    # the answers sent, then the saved draft's answers to the other questions, of this assessment only
+    questions, drafts = models.Question.__table__, models.Draft.__table__
+    of_assessment = select(questions.c.id).where(questions.c.assessment_id == assessment_id)
+    stored = []
+    if submission.rows:
+        answers = values(column('id', String), column('question_id', String), column('stu_answer', String),
+                         column('stu_answer_id', String), name='answers').data(
+            [(row['id'], row['question_id'], row['stu_answer'], row['stu_answer_id']) for row in submission.rows])
+        stored.append(select(answers.c.id, literal(student_id, String), literal(assessment_id, String),
+                             answers.c.question_id, answers.c.stu_answer, answers.c.stu_answer_id).where(
+            accepted, answers.c.question_id.in_(of_assessment)))
+    option = func.json_array_elements(drafts.c.answers).table_valued(
+        column('value', JSON), with_ordinality='ordinality').lateral('option')
+    stored.append(select(
+        func.left(func.md5(drafts.c.id + '-' + cast(option.c.ordinality, String)), 15),
+        drafts.c.student_id, drafts.c.assessment_id, drafts.c.question_id,
+        option.c.value['stu_answer'].astext, func.coalesce(option.c.value['stu_answer_id'].astext, '-1')
+    ).select_from(drafts).join(option, true()).where(
+        accepted, drafts.c.assessment_id == assessment_id, drafts.c.student_id == student_id,
+        drafts.c.question_id.not_in(sorted({row['question_id'] for row in submission.rows}))))
+    writes = [insert(models.Submission.__table__).from_select(
+        ['id', 'student_id', 'assessment_id', 'question_id', 'stu_answer', 'stu_answer_id'],
+        union_all(*stored)).cte('stored_answers')]
+    times = models.AssessmentTimeRecords.__table__
+    writes.append(update(times).where(times.c.assessment_id == assessment_id, times.c.student_id == student_id,
+                                      accepted).values(end_datetime=submission.submitted_at).cte('ended'))
+    writes.append(delete(drafts).where(drafts.c.assessment_id == assessment_id, drafts.c.student_id == student_id,
+                                       accepted).cte('promoted_draft'))
+
+    # the main query sees the receipts from before the statement
+    stored_key = select(receipts.c.idempotency_key).where(
+        receipts.c.assessment_id == assessment_id, receipts.c.student_id == student_id).scalar_subquery()
+    return select(eligible.label('eligible'), accepted.label('accepted'),
+                  stored_key.label('stored_key')).add_cte(*writes)
+
+
+def insert_submissions(db: Session, pending: Sequence[PendingSubmission]) -> List[str]:
+    """Adds submissions to the caller's transaction, returning what became of each."""
+    outcomes = []
+    for submission in pending:
+        row = db.execute(submit_statement(submission)).one()
+        if row.accepted:
+            outcomes.append(CREATED)
+        elif not row.eligible:
+            outcomes.append(INELIGIBLE)
+        elif submission.idempotency_key and row.stored_key and submission.idempotency_key != row.stored_key:
+            outcomes.append(CONFLICT)
+        else:
+            outcomes.append(DUPLICATE)
+    return outcomes
+
+
+class WriterStats:
+    """Batch sizes and flush times of the group commit writer."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.submissions = 0
+        self.rows = 0
+        self.failed = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        # batches by size rounded up to a power of two
+        self.batch_sizes: Counter = Counter()
+
+    def record(self, submissions: int, rows: int, failed: int, seconds: float):
+        with self._lock:
+            self.batches += 1
+            self.submissions += submissions
+            self.rows += rows
+            self.failed += failed
+            self.flush_seconds += seconds
+            self.max_flush_seconds = max(self.max_flush_seconds, seconds)
+            self.batch_sizes[1 << (submissions - 1).bit_length()] += 1
+
+    def as_dict(self) -> Dict[str, object]:
+        with self._lock:
+            return {'batches': self.batches, 'submissions': self.submissions, 'rows': self.rows,
+                    'failed': self.failed, 'flush_seconds': round(self.flush_seconds, 3),
+                    'mean_flush_seconds': round(self.flush_seconds / self.batches, 4) if self.batches else None,
+                    'max_flush_seconds': round(self.max_flush_seconds, 4),
+                    'mean_batch_size': round(self.submissions / self.batches, 1) if self.batches else None,
+                    'batch_sizes': {f'<={size}': count for size, count in sorted(self.batch_sizes.items())}}
+
+
+class GroupCommitWriter:
+    """Writes the submissions of many requests in one transaction.
+
+    Request threads queue their submission and wait. A writer thread takes
+    up to ``max_batch`` submissions, or whatever arrived within
+    ``max_delay`` seconds of the first, and commits them together, so a
+    request is answered only once its answers are durable. When a batch
+    fails its submissions are retried one by one so a bad one fails alone.
+    """
+
+    def __init__(self, max_batch: int, max_delay: float):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.stats = WriterStats()
+        self._queue: 'queue.Queue[Optional[PendingSubmission]]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='submission-writer', daemon=True)
+                self._thread.start()
+
+    def write(self, submission: PendingSubmission, timeout: Optional[float] = None) -> str:
+        """Blocks until the submission is committed, returning its outcome or raising what failed it."""
+        self._ensure_started()
+        self._queue.put(submission)
+        return submission.future.result(timeout)
+
+    def stop(self):
+        """Flushes what is queued and ends the writer thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    submission = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if submission is None:
+                    stopping = True
+                    break
+                batch.append(submission)
+            self._flush(batch)
+
+    def _flush(self, batch: List[PendingSubmission]):
+        start = time.perf_counter()
+        failed = 0
+        db = SessionLocal()
+        try:
+            try:
+                committed = list(zip(batch, insert_submissions(db, batch)))
+                db.commit()
+            except Exception:
+                db.rollback()
+                logger.exception("group commit of %d submissions failed, writing them one by one", len(batch))
+                committed = []
+                for submission in batch:
+                    try:
+                        outcome, = insert_submissions(db, [submission])
+                        db.commit()
+                        committed.append((submission, outcome))
+                    except Exception as e:
+                        db.rollback()
+                        failed += 1
+                        submission.future.set_exception(e)
+            for submission, outcome in committed:
+                submission.future.set_result(outcome)
+        except Exception as e:
+            # whatever went wrong, nobody is left waiting
+            for submission in batch:
+                if not submission.future.done():
+                    submission.future.set_exception(e)
+        finally:
+            db.close()
+            seconds = time.perf_counter() - start
+            self.stats.record(len(batch), sum(len(submission.rows) for submission in batch), failed, seconds)
+            logger.debug("submission_batch size=%d failed=%d seconds=%.4f", len(batch), failed, seconds)
+
+
+writer = GroupCommitWriter(settings.group_commit_max_batch, settings.group_commit_max_delay_ms / 1000)
@@ -0,0 +1,238 @@
+"""Rows per second of the row-wise markers against app.marking.engine.
+
+Run from the repository root:
+
+    python -m benchmarks.marking_engine --students 600 --questions 60
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.marking import engine
+
+
+# row-wise markers as they were in app/routers/mark.py, kept as the baseline
+def legacy_mark_obj(df):
+    df['score'] = df.apply(lambda x: x['mark'] if (
+        x['ref_answer_id'] == (x['stu_answer_id'])) else 0, axis=1)
+    return df[engine.SCORE_COLUMNS]
+
+
+def legacy_text_comparison(ref: str, student_ans: str):
+    if student_ans.lower() in ref.lower():
+        return 1
+    return 0
+
+
+def legacy_mark_sub_obj(df):
+    df['score'] = df.apply(lambda x: legacy_text_comparison(
+        x['ref_answer'], x['stu_answer']) * x['mark'], axis=1)
+    return df[engine.SCORE_COLUMNS]
+
+
+def legacy_mark_maths(df):
+    df['tolerance'] = df['tolerance'].fillna(0)
+    df['score'] = df.apply(lambda x: x['mark'] if ((float(x['stu_answer']) >= (float(x['ref_answer']) - x['tolerance'])) and
+                           (float(x['stu_answer']) <= (float(x['ref_answer']) + x['tolerance']))) else 0, axis=1)
+    return df[engine.SCORE_COLUMNS]
+
+
+def legacy_check_multi_choice_answers(user_answers, correct_answers):
+    is_correct = 0
+    for question_id, correct_answer in correct_answers.items():
+        user_answer = user_answers.get(question_id, [])
+        if set(user_answer) == set(correct_answer):
+            is_correct = 1
+    return is_correct
+
+
+def legacy_mark_multi_obj(df):
+    assessment_id = df['assessment_id'].iloc[0]
+    result_df = pd.DataFrame(columns=engine.SCORE_COLUMNS)
+    questions = df["question_id"].unique().tolist()
+    users = df["student_id"].unique().tolist()
+    for question in questions:
+        correct_answers = df[df['question_id'] ==
+                             question]['ref_answer_id'].unique().tolist()
+        score = df[df['question_id'] == question]['mark'].iloc[0]
+        correct_answers_dict = {question: correct_answers}
+        for user in users:
+            user_answers = df[(df['question_id'] == question) & (
+                df["student_id"] == user)]['stu_answer_id'].unique().tolist()
+            user_answers_dict = {question: user_answers}
+            is_correct = legacy_check_multi_choice_answers(
+                user_answers_dict, correct_answers_dict)
+            row = {'assessment_id': assessment_id, 'question_id': question,
+                   'student_id': user, 'score': is_correct*score}
+            result_df = pd.concat([result_df, pd.DataFrame([row])],
+                                  axis=0, ignore_index=True)
+    return result_df
+
+
+def legacy_check_sub_answers(user_answers, correct_answers):
+    sum_score = 0
+    for question_id, correct_answer in correct_answers.items():
+        user_answer = user_answers.get(question_id, [])
+        for answer in correct_answer:
+            for stu_answer in user_answer:
+                sum_score += legacy_text_comparison(answer, stu_answer)
+    return sum_score
+
+
+def legacy_mark_multiple_sub(df):
+    assessment_id = df['assessment_id'].iloc[0]
+    result_df = pd.DataFrame(columns=engine.SCORE_COLUMNS)
+    questions = df["question_id"].unique().tolist()
+    users = df["student_id"].unique().tolist()
+    for question in questions:
+        correct_answers = df[df['question_id'] ==
+                             question]["ref_answer"].unique().tolist()
+        mark = df[df['question_id'] == question]['mark'].iloc[0]
+        num_answer = int(df[df['question_id'] == question]
+                         ['num_answer'].iloc[0])
+        correct_answers_dict = {question: correct_answers}
+        for user in users:
+            user_answers = df[(df['question_id'] == question) & (
+                df["student_id"] == user)]['stu_answer'].unique().tolist()
+            user_answers_dict = {question: user_answers}
+            sum_score = legacy_check_sub_answers(
+                user_answers_dict, correct_answers_dict)
+            row = {'assessment_id': assessment_id, 'question_id': question,
+                   'student_id': user, 'score': sum_score*mark/num_answer}
+            result_df = pd.concat([result_df, pd.DataFrame([row])],
+                                  axis=0, ignore_index=True)
+    return result_df
+
+
+WORDS = ['voltage', 'current', 'resistor', 'capacitor', 'diode', 'transistor',
+         'ohm', 'ampere', 'parallel', 'series', 'gate', 'drain', 'source']
+
+
+def make_frame(students: int, questions: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    rows = students * questions
+    question_ids = np.repeat([f'Q{i}' for i in range(questions)], students)
+    student_ids = np.tile([f'2018{i:07d}' for i in range(students)], questions)
+    ref_words = rng.choice(WORDS, size=(rows, 3))
+    stu_words = np.where(rng.random(rows) < 0.6, ref_words[:, 1],
+                         rng.choice(WORDS, size=rows))
+    ref_number = rng.integers(1, 500, size=rows)
+    stu_number = ref_number + rng.normal(0, 1.0, size=rows)
+    return pd.DataFrame({
+        'assessment_id': 'BENCH',
+        'question_id': question_ids,
+        'mark': rng.integers(1, 5, size=rows),
+        'tolerance': np.where(rng.random(rows) < 0.5, 0.5, np.nan),
+        'num_answer': 1,
+        'ref_answer_id': rng.choice(['A', 'B', 'C', 'D'], size=rows),
+        'stu_answer_id': rng.choice(['A', 'B', 'C', 'D'], size=rows),
+        'student_id': student_ids,
+        'ref_text': [' '.join(words) for words in ref_words],
+        'stu_text': stu_words,
+        'ref_number': ref_number.astype(str),
+        'stu_number': np.round(stu_number, 2).astype(str),
+    })
+
+
+def make_multi_choice_frame(students: int, questions: int, seed: int = 0) -> pd.DataFrame:
+    # one row per (selected option x correct option), as the marking join yields
+    rng = np.random.default_rng(seed)
+    options = np.array(['A', 'B', 'C', 'D', 'E'])
+    rows = []
+    for q in range(questions):
+        correct = rng.choice(options, size=rng.integers(1, 4), replace=False)
+        mark = int(rng.integers(1, 5))
+        for s in range(students):
+            if rng.random() < 0.05:
+                continue
+            selected = correct if rng.random() < 0.5 else rng.choice(
+                options, size=rng.integers(1, 4), replace=False)
+            for stu_answer_id in selected:
+                for ref_answer_id in correct:
+                    rows.append(('BENCH', f'Q{q}', mark, ref_answer_id,
+                                 f'2018{s:07d}', stu_answer_id))
+    return pd.DataFrame.from_records(rows, columns=[
+        'assessment_id', 'question_id', 'mark', 'ref_answer_id',
+        'student_id', 'stu_answer_id'])
+
+
+def make_multiple_sub_frame(students: int, questions: int, seed: int = 0) -> pd.DataFrame:
+    # fill in the blank questions with several accepted answers each
+    rng = np.random.default_rng(seed)
+    rows = []
+    for q in range(questions):
+        references = rng.choice(WORDS, size=rng.integers(2, 6), replace=False)
+        num_answer = int(rng.integers(1, len(references) + 1))
+        mark = int(rng.integers(1, 5))
+        for s in range(students):
+            for stu_answer in rng.choice(WORDS, size=num_answer):
+                stu_answer = stu_answer.upper() if rng.random() < 0.2 else stu_answer
+                for ref_answer in references:
+                    rows.append(('BENCH', f'Q{q}', mark, num_answer, ref_answer,
+                                 f'2018{s:07d}', stu_answer))
+    return pd.DataFrame.from_records(rows, columns=[
+        'assessment_id', 'question_id', 'mark', 'num_answer', 'ref_answer',
+        'student_id', 'stu_answer'])
+
+
+def frame_for(kind: str, df: pd.DataFrame) -> pd.DataFrame:
+    if kind == 'sub_obj':
+        return df.rename(columns={'ref_text': 'ref_answer', 'stu_text': 'stu_answer'})
+    if kind == 'maths':
+        return df.rename(columns={'ref_number': 'ref_answer', 'stu_number': 'stu_answer'})
+    return df
+
+
+MARKERS = {
+    'obj': (legacy_mark_obj, engine.mark_obj),
+    'sub_obj': (legacy_mark_sub_obj, engine.mark_sub_obj),
+    'maths': (legacy_mark_maths, engine.mark_maths),
+}
+
+# markers whose baseline loops over every (question, student) pair
+LOOP_MARKERS = {
+    'multi_obj': (make_multi_choice_frame, legacy_mark_multi_obj, engine.mark_multi_obj),
+    'multi_sub': (make_multiple_sub_frame, legacy_mark_multiple_sub, engine.mark_multiple_sub),
+}
+
+
+def timed(marker, df: pd.DataFrame, repeat: int):
+    best = float('inf')
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        result = marker(frame)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=600)
+    parser.add_argument('--questions', type=int, default=60)
+    parser.add_argument('--loop-students', type=int, default=200,
+                        help='students for markers with a nested loop baseline')
+    parser.add_argument('--loop-questions', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.students, args.questions)
+    print(f"{'marker':<10}{'rows':>10}{'before rows/s':>16}{'after rows/s':>16}{'speedup':>10}")
+    runs = [(kind, frame_for(kind, df), before, after)
+            for kind, (before, after) in MARKERS.items()]
+    runs += [(kind, make(args.loop_students, args.loop_questions), before, after)
+             for kind, (make, before, after) in LOOP_MARKERS.items()]
+    for kind, frame, before, after in runs:
+        before_time, expected = timed(before, frame, args.repeat)
+        after_time, result = timed(after, frame, args.repeat)
+        pd.testing.assert_frame_equal(expected.reset_index(drop=True),
+                                      result.reset_index(drop=True),
+                                      check_dtype=False)
+        print(f'{kind:<10}{len(frame):>10}{len(frame) / before_time:>16,.0f}'
+              f'{len(frame) / after_time:>16,.0f}{before_time / after_time:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Throughput and peak memory of every marker and of the whole marking pipeline.
+
+Runs on a synthetic assessment (benchmarks.synthetic) with the stub
+similarity backend, so no model or network is involved. Results are
+written as JSON; pass an earlier result with --compare to see the change.
+
+    python -m benchmarks.marking_suite --students 500 --questions 10 --output after.json
+    python -m benchmarks.marking_suite --compare before.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+from app.marking import pipeline
+from app.marking.metrics import MarkingReport
+from app.marking.similarity import StubSimilarityBackend
+from benchmarks.synthetic import AssessmentGenerator
+
+
+def measure(name: str, run: Callable[[], object], rows: int, repeat: int) -> dict:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    # tracing slows allocation down, memory is measured on a separate run
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'name': name, 'rows': rows, 'seconds': round(best, 6),
+            'rows_per_second': round(rows / best, 1) if best else None,
+            'peak_memory_bytes': peak}
+
+
+def run_suite(students: int, questions: int, repeat: int, seed: int) -> dict:
+    # mark_submissions looks the backend up from the settings
+    settings.similarity_backend = 'stub'
+    backend = StubSimilarityBackend()
+    sub_df = AssessmentGenerator(seed).assessment(students, questions)
+
+    results = []
+    for stage, question_type, marker, df in pipeline.stage_frames(sub_df):
+        kwargs = {} if question_type in pipeline.DETERMINISTIC_TYPES else {'backend': backend}
+        results.append(measure(f'marker.{stage}', lambda: marker(df.copy(), **kwargs), len(df), repeat))
+    results.append(measure('pipeline.mark_submissions',
+                           lambda: pipeline.mark_submissions(sub_df), len(sub_df), repeat))
+
+    report = MarkingReport()
+    pipeline.mark_submissions(sub_df, report=report)
+    return {
+        'benchmark': 'marking',
+        'params': {'students': students, 'questions_per_kind': questions, 'repeat': repeat,
+                   'seed': seed, 'rows': len(sub_df)},
+        'environment': {'python': platform.python_version(), 'pandas': pd.__version__,
+                        'numpy': np.__version__, 'machine': platform.machine()},
+        'results': results,
+        'stages': report.as_dict(),
+    }
+
+
+def compare(current: dict, baseline: dict):
+    before = {result['name']: result for result in baseline['results']}
+    print(f"{'name':<32}{'rows/s':>14}{'baseline':>14}{'speedup':>10}{'peak MB':>10}{'baseline':>10}")
+    for result in current['results']:
+        old = before.get(result['name'])
+        if old is None:
+            continue
+        print(f"{result['name']:<32}{result['rows_per_second']:>14,.0f}{old['rows_per_second']:>14,.0f}"
+              f"{result['rows_per_second'] / old['rows_per_second']:>9.2f}x"
+              f"{result['peak_memory_bytes'] / 2 ** 20:>10.1f}{old['peak_memory_bytes'] / 2 ** 20:>10.1f}")
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--questions', type=int, default=10,
+                        help='questions of each question_type x is_multi_choice kind')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON result here instead of stdout')
+    parser.add_argument('--compare', help='an earlier JSON result to compare against')
+    args = parser.parse_args(argv)
+
+    result = run_suite(args.students, args.questions, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    elif not args.compare:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Latency of POST /submissions/ with many students submitting at the same moment.
+
+Runs against a live server and database. Every enrolled student of the
+assessment (up to --students) gets a token and a full answer sheet, then
+all of them submit at once, like at an exam's deadline. Students who
+already submitted are skipped by the endpoint, pass --reset to delete
+their submissions first.
+
+    python -m benchmarks.submission_load --url http://localhost:8000 --assessment <id> --students 500
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import List, Optional
+
+import httpx
+import numpy as np
+
+from app import models, oauth2
+from app.database import SessionLocal
+from app.marking import answer_key
+
+
+def answer_sheet(key: answer_key.AnswerKey, rng: random.Random) -> List[dict]:
+    sheet = []
+    for question in key.questions:
+        options = key.options.get(question['id'], [])
+        if question['question_type'] == 'obj' and options:
+            chosen = rng.sample(options, rng.randint(1, len(options))) if question['is_multi_choice'] \
+                else [rng.choice(options)]
+            sheet += [{'question_id': question['id'], 'stu_answer_id': option['id']} for option in chosen]
+        else:
+            text = rng.choice(options)['option'] if options else 'no idea'
+            sheet.append({'question_id': question['id'], 'stu_answer': text})
+    return sheet
+
+
+def prepare(assessment_id: str, students: int, reset: bool, seed: int) -> List[tuple]:
+    """(token, payload) of each submitter."""
+    rng = random.Random(seed)
+    db = SessionLocal()
+    try:
+        key = answer_key.get(db, assessment_id)
+        if key is None:
+            raise SystemExit(f'no assessment {assessment_id}')
+        student_ids = [reg_num for reg_num, in db.query(models.Enrollment.reg_num).join(
+            models.Assessment, models.Assessment.course_id == models.Enrollment.course_code).filter(
+            models.Assessment.id == assessment_id).limit(students)]
+        if reset:
+            for model in (models.Submission, models.SubmissionReceipt):
+                db.query(model).filter(model.assessment_id == assessment_id,
+                                       model.student_id.in_(student_ids)).delete(synchronize_session=False)
+            db.commit()
+        return [(oauth2.create_access_token({'user_id': student_id, 'is_instructor': False}),
+                 {'assessment_id': assessment_id, 'submissions': answer_sheet(key, rng)})
+                for student_id in student_ids]
+    finally:
+        db.close()
+
+
+async def submit(client: httpx.AsyncClient, start: asyncio.Event, token: str, payload: dict) -> tuple:
+    await start.wait()
+    began = time.perf_counter()
+    response = await client.post('/submissions/', json=payload, headers={
+        'Authorization': f'Bearer {token}', 'Idempotency-Key': uuid.uuid4().hex})
+    return time.perf_counter() - began, response.status_code
+
+
+async def run(url: str, submitters: List[tuple], timeout: float) -> dict:
+    start = asyncio.Event()
+    limits = httpx.Limits(max_connections=len(submitters), max_keepalive_connections=len(submitters))
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        tasks = [asyncio.create_task(submit(client, start, token, payload)) for token, payload in submitters]
+        await asyncio.sleep(0)
+        began = time.perf_counter()
+        start.set()
+        results = await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - began
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    statuses = {}
+    for _, status_code in results:
+        statuses[status_code] = statuses.get(status_code, 0) + 1
+    return {
+        'submitters': len(submitters),
+        'answers_per_submission': len(submitters[0][1]['submissions']) if submitters else 0,
+        'seconds': round(elapsed, 3),
+        'submissions_per_second': round(len(submitters) / elapsed, 1) if elapsed else None,
+        'latency_ms': {name: round(float(np.percentile(latencies, q)), 1)
+                       for name, q in [('p50', 50), ('p95', 95), ('p99', 99), ('max', 100)]},
+        'statuses': statuses,
+    }
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--assessment', required=True)
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--reset', action='store_true',
+                        help="delete the students' earlier submissions and receipts of the assessment first")
+    args = parser.parse_args(argv)
+
+    submitters = prepare(args.assessment, args.students, args.reset, args.seed)
+    if not submitters:
+        raise SystemExit('no enrolled students to submit as')
+    print(json.dumps(asyncio.run(run(args.url, submitters, args.timeout)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Synthetic assessments shaped like the rows the marking join returns.
+
+Reference and student answer texts are drawn from "Sample questions.csv"
+so nlp and fill in the blank questions see realistic sentence lengths and
+paraphrases. Every question_type x is_multi_choice combination is covered.
+"""
+import os
+import re
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.marking.pipeline import CATEGORY_COLUMNS, SUBMISSION_COLUMNS
+
+
+SAMPLE_QUESTIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'Sample questions.csv')
+
+# (question_type, is_multi_choice)
+QUESTION_KINDS = [('obj', False), ('obj', True), ('sub_obj', False), ('sub_obj', True),
+                  ('maths', False), ('maths', True), ('nlp', False), ('nlp', True)]
+
+OPTIONS = ['A', 'B', 'C', 'D', 'E']
+
+
+def load_samples(path: str = SAMPLE_QUESTIONS) -> List[Tuple[str, str]]:
+    """(reference answer, student answer) pairs of the sample questions."""
+    samples = pd.read_csv(path, encoding='utf-8-sig').dropna(subset=['ref_answers'])
+    return list(zip(samples['ref_answers'], samples['stud_answers'].fillna('')))
+
+
+class AssessmentGenerator:
+    """Builds submission frames from a seeded random generator."""
+
+    def __init__(self, seed: int = 0, samples: List[Tuple[str, str]] = None):
+        self.rng = np.random.default_rng(seed)
+        self.samples = samples or load_samples()
+        self.words = sorted({word.lower() for reference, _ in self.samples
+                             for word in re.findall(r'[A-Za-z]{4,}', reference)})
+
+    def _choice(self, values):
+        return values[self.rng.integers(len(values))]
+
+    def _phrase(self, reference: str) -> str:
+        words = reference.split()
+        start = int(self.rng.integers(len(words)))
+        return ' '.join(words[start:start + int(self.rng.integers(1, 4))]).strip('.,')
+
+    def _answer_text(self, reference: str, paraphrase: str) -> str:
+        # the answer styles a marker meets: verbatim, shouting, a paraphrase,
+        # a fragment, shuffled words, an unrelated sample and a blank
+        style = self.rng.random()
+        if style < 0.15:
+            return reference
+        if style < 0.25:
+            return reference.upper()
+        if style < 0.5:
+            return paraphrase
+        if style < 0.65:
+            words = reference.split()
+            return ' '.join(words[:max(1, len(words) // 3)])
+        if style < 0.75:
+            words = reference.split()
+            self.rng.shuffle(words)
+            return ' '.join(words)
+        if style < 0.95:
+            return self._choice(self.samples)[1]
+        return ''
+
+    def _fill_in(self, accepted: List[str]) -> str:
+        style = self.rng.random()
+        if style < 0.5:
+            return self._choice(accepted)
+        if style < 0.6:
+            return self._choice(accepted).upper()
+        if style < 0.7:
+            return ' ' + self._choice(accepted) + ' '
+        return self._choice(self.words)
+
+    def _number(self, reference: float, tolerance: float) -> str:
+        style = self.rng.random()
+        if style < 0.5:
+            return f'{reference:g}'
+        if style < 0.75:
+            return f'{reference + self.rng.uniform(-tolerance, tolerance):.3f}'
+        if style < 0.95:
+            return f'{reference + self.rng.uniform(1, 10):.2f}'
+        return 'not sure'
+
+    def question(self, question_id: str, question_type: str, is_multi_choice: bool) -> dict:
+        reference, paraphrase = self._choice(self.samples)
+        question = {'question_id': question_id, 'question_type': question_type,
+                    'is_multi_choice': is_multi_choice, 'mark': int(self.rng.integers(1, 6)),
+                    'tolerance': None, 'num_answer': None, 'paraphrase': paraphrase}
+        if question_type == 'obj':
+            count = int(self.rng.integers(2, 4)) if is_multi_choice else 1
+            question['correct'] = [(option, option) for option in
+                                   self.rng.choice(OPTIONS, size=count, replace=False)]
+        elif question_type == 'sub_obj':
+            count = int(self.rng.integers(2, 5)) if is_multi_choice else int(self.rng.integers(1, 3))
+            question['correct'] = [(f'{question_id}-{i}', self._phrase(reference)) for i in range(count)]
+            question['num_answer'] = int(self.rng.integers(1, count + 1)) if is_multi_choice else None
+        elif question_type == 'maths':
+            value = float(np.round(self.rng.uniform(-500, 500), 2))
+            question['tolerance'] = float(self._choice([0, 0.01, 0.5]))
+            question['correct'] = [(f'{question_id}-0', f'{value:g}')]
+        else:
+            if is_multi_choice:
+                clauses = [clause.strip() for clause in re.split(r'[,;]| while | and ', reference)
+                           if clause.strip()]
+                question['correct'] = [(f'{question_id}-{i}', clause) for i, clause in enumerate(clauses)]
+                question['num_answer'] = int(self.rng.integers(1, len(clauses) + 1))
+            else:
+                question['correct'] = [(f'{question_id}-0', reference)]
+        return question
+
+    def answers(self, question: dict) -> List[Tuple[str, str]]:
+        """(stu_answer_id, stu_answer) rows a student submitted for a question."""
+        question_type, correct = question['question_type'], question['correct']
+        if question_type == 'obj':
+            if question['is_multi_choice']:
+                if self.rng.random() < 0.5:
+                    return [(option, None) for option, _ in correct]
+                size = int(self.rng.integers(1, 4))
+                return [(option, None) for option in self.rng.choice(OPTIONS, size=size, replace=False)]
+            return [(self._choice(OPTIONS), None)]
+        texts = [text for _, text in correct]
+        if question_type == 'sub_obj':
+            count = question['num_answer'] or 1
+            return [('-1', self._fill_in(texts)) for _ in range(count)]
+        if question_type == 'maths':
+            return [('-1', self._number(float(texts[0]), question['tolerance']))]
+        count = question['num_answer'] or 1
+        return [('-1', self._answer_text(self._choice(texts), question['paraphrase']))
+                for _ in range(count)]
+
+    def assessment(self, students: int, questions: int, assessment_id: str = 'BENCH',
+                   kinds: List[Tuple[str, bool]] = QUESTION_KINDS) -> pd.DataFrame:
+        """``questions`` questions of every kind answered by ``students`` students."""
+        student_ids = [f'2018{i:07d}' for i in range(students)]
+        rows = []
+        for question_type, is_multi_choice in kinds:
+            for q in range(questions):
+                question = self.question(f"{question_type}{'-multi' if is_multi_choice else ''}-{q}",
+                                         question_type, is_multi_choice)
+                for student_id in student_ids:
+                    if self.rng.random() < 0.03:
+                        # a few students skip a question
+                        continue
+                    for stu_answer_id, stu_answer in self.answers(question):
+                        for ref_answer_id, ref_answer in question['correct']:
+                            rows.append((assessment_id, question['question_id'], question['mark'],
+                                         question_type, is_multi_choice, question['tolerance'],
+                                         question['num_answer'], ref_answer_id, ref_answer,
+                                         student_id, stu_answer, stu_answer_id))
+        return pd.DataFrame.from_records(rows, columns=SUBMISSION_COLUMNS).astype(
+            {column: 'category' for column in CATEGORY_COLUMNS})
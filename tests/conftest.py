@@ -0,0 +1,9 @@
+import os
+
+# app.config reads these from the environment or .env, tests never reach the services
+for name in ('DATABASE_HOSTNAME', 'DATABASE_PASSWORD', 'DATABASE_NAME', 'DATABASE_USERNAME',
+             'SECRET_KEY', 'ALGORITHM', 'CLOUD_API_KEY', 'CLOUD_API_SECRET', 'CLOUD_API_NAME', 'API_TOKEN'):
+    os.environ.setdefault(name, 'test')
+os.environ.setdefault('DATABASE_PORT', '5432')
+os.environ.setdefault('REVIEW_AFTER', '1')
+os.environ.setdefault('ACCESS_TOKEN_EXPIRE_MINUTES', '30')
@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+
+from app.marking.embedding_cache import EmbeddingStore, cache_key
+
+
+def vector(value):
+    return np.full(4, value, dtype=np.float32)
+
+
+def keys(*texts):
+    return [cache_key('model', text) for text in texts]
+
+
+def test_reads_do_not_rewrite_the_index(tmp_path):
+    store = EmbeddingStore(str(tmp_path), capacity=4)
+    a, b = keys('a', 'b')
+    store.put({a: vector(1), b: vector(2)})
+    saved = os.stat(tmp_path / 'index.npz').st_mtime_ns
+
+    found = store.get([a, b, cache_key('model', 'c')])
+
+    assert np.array_equal(found[a], vector(1)) and np.array_equal(found[b], vector(2))
+    assert os.stat(tmp_path / 'index.npz').st_mtime_ns == saved
+    assert (store.hits, store.misses) == (2, 1)
+
+
+def test_recency_of_reads_is_saved_with_the_next_put(tmp_path):
+    store = EmbeddingStore(str(tmp_path), capacity=2)
+    a, b, c = keys('a', 'b', 'c')
+    store.put({a: vector(1)})
+    store.put({b: vector(2)})
+    store.get([a])
+
+    # b is now the least recently used and makes room for c
+    store.put({c: vector(3)})
+
+    reopened = EmbeddingStore(str(tmp_path), capacity=2)
+    assert set(reopened.get([a, b, c])) == {a, c}
+
+
+def test_recency_of_reads_survives_another_workers_write(tmp_path):
+    store = EmbeddingStore(str(tmp_path), capacity=3)
+    other = EmbeddingStore(str(tmp_path), capacity=3)
+    a, b, c, d = keys('a', 'b', 'c', 'd')
+    store.put({a: vector(1), b: vector(2)})
+    store.get([a])
+    other.put({c: vector(3)})
+
+    store.put({d: vector(4)})
+
+    assert set(EmbeddingStore(str(tmp_path), capacity=3).get([a, b, c, d])) == {a, c, d}
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from app.marking.grader import Grader, ThresholdGrader
+
+
+def test_threshold_grader_gives_full_half_and_no_marks():
+    similarity = np.array([0.0, 0.39, 0.4, 0.69, 0.7, 1.0])
+
+    assert ThresholdGrader().grade(similarity, [], []).tolist() == [0.0, 0.0, 0.5, 0.5, 1.0, 1.0]
+
+
+def test_grader_without_grade_cannot_be_created():
+    class Incomplete(Grader):
+        name = 'incomplete'
+
+    with pytest.raises(TypeError):
+        Incomplete()
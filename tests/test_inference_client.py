@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.marking.inference_client import InferenceClient, InferenceError
+
+
+class InferenceServer:
+    """A stand-in for the hosted API answering each call with ``respond(call_number, payload)``.
+
+    ``respond`` returns (status, body, seconds to wait before answering);
+    by default a sentence ``s<i>`` scores i, so the order of the results shows.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.respond = lambda number, payload: (200, [float(s[1:]) for s in payload['inputs']['sentences']], 0)
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with server._lock:
+                    server.calls.append(payload)
+                    number = len(server.calls)
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    status, body, delay = server.respond(number, payload)
+                    time.sleep(delay)
+                    data = json.dumps(body).encode()
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client timed out and hung up
+                    pass
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/'
+
+
+@pytest.fixture
+def server():
+    stand_in = InferenceServer()
+    thread = threading.Thread(target=stand_in.httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield stand_in
+    stand_in.httpd.shutdown()
+    stand_in.httpd.server_close()
+
+
+def client(server, **kwargs):
+    kwargs = dict({'backoff': 0.01, 'max_backoff': 1}, **kwargs)
+    return InferenceClient(server.url, {}, **kwargs)
+
+
+def sentences(n):
+    return [f's{i}' for i in range(n)]
+
+
+def test_answers_are_sent_batch_size_at_a_time(server):
+    scores = client(server, batch_size=3).similarity('reference', sentences(7))
+
+    assert scores == [float(i) for i in range(7)]
+    assert sorted(len(call['inputs']['sentences']) for call in server.calls) == [1, 3, 3]
+    assert all(call['inputs']['source_sentence'] == 'reference' for call in server.calls)
+
+
+def test_loading_model_is_retried_after_its_estimated_time(server):
+    server.respond = lambda number, payload: (
+        (503, {'error': 'loading', 'estimated_time': 0.3}, 0) if number == 1 else (200, [0.5], 0))
+
+    start = time.perf_counter()
+    assert client(server).similarity('reference', ['s0']) == [0.5]
+
+    assert len(server.calls) == 2
+    assert time.perf_counter() - start >= 0.3
+
+
+def test_gives_up_after_max_retries(server):
+    server.respond = lambda number, payload: (503, {'error': 'loading', 'estimated_time': 0}, 0)
+
+    with pytest.raises(InferenceError, match='503'):
+        client(server, max_retries=2).similarity('reference', ['s0'])
+    assert len(server.calls) == 3
+
+
+def test_slow_call_times_out(server):
+    server.respond = lambda number, payload: (200, [0.5], 1)
+
+    start = time.perf_counter()
+    with pytest.raises(InferenceError, match='failed'):
+        client(server, timeout=0.2, max_retries=1).similarity('reference', ['s0'])
+
+    assert len(server.calls) == 2
+    assert time.perf_counter() - start < 1
+
+
+def test_calls_in_flight_are_capped(server):
+    server.respond = lambda number, payload: (200, [0.5], 0.1)
+
+    scores = client(server, max_concurrency=2, batch_size=1).similarity_many(
+        [('first', sentences(3)), ('second', sentences(3))])
+
+    assert scores == [[0.5] * 3, [0.5] * 3]
+    assert len(server.calls) == 6
+    assert server.max_in_flight == 2
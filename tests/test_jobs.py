@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from app.marking import jobs
+
+
+class FakeMarking:
+    """Stands in for run_marking, holding each run until it is released."""
+
+    def __init__(self):
+        self.key_version = 1
+        self.runs = []
+        self._released = {}
+
+    def __call__(self, db, assessment_id, job, unscored_only=False, report=None, question_ids=None):
+        job.set_key_version(self.key_version)
+        self.runs.append((job.question_ids, job.key_version))
+        self._event(job).wait(5)
+        return {}
+
+    def _event(self, job):
+        return self._released.setdefault(job.id, threading.Event())
+
+    def finish(self, job):
+        self._event(job).set()
+        deadline = time.monotonic() + 5
+        while job.is_active and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+def wait_running(job):
+    deadline = time.monotonic() + 5
+    while job.key_version is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def marking(monkeypatch):
+    fake = FakeMarking()
+    monkeypatch.setattr(jobs, 'run_marking', fake)
+    monkeypatch.setattr(jobs, '_current_key_version', lambda assessment_id: fake.key_version)
+    monkeypatch.setattr(jobs, 'SessionLocal', lambda: type('Session', (), {'close': lambda self: None})())
+    yield fake
+    for job in list(jobs._jobs.values()):
+        fake.finish(job)
+
+
+def test_running_full_run_covers_a_remark_with_the_same_key(marking):
+    full = jobs.submit('A1')
+    wait_running(full)
+
+    assert jobs.submit('A1', question_ids=['Q1']) is full
+    assert jobs.submit('A1') is full
+
+
+def test_remark_after_a_key_edit_is_queued_behind_the_running_job(marking):
+    full = jobs.submit('A2')
+    wait_running(full)
+    marking.key_version = 2
+
+    remark = jobs.submit('A2', question_ids=['Q1'])
+    assert remark is not full
+    assert remark.status == 'queued'
+    # the queued run will read the new key, it covers repeats of the request
+    assert jobs.submit('A2', question_ids=['Q1']) is remark
+
+    marking.finish(full)
+    wait_running(remark)
+    assert remark.key_version == 2
+    assert marking.runs[-1] == (['Q1'], 2)
+
+
+def test_closing_pass_is_queued_behind_a_running_full_run(marking):
+    full = jobs.submit('A3')
+    wait_running(full)
+
+    closing = jobs.submit('A3', unscored_only=True)
+    assert closing is not full
+    assert closing.status == 'queued'
+
+
+def test_remark_of_other_questions_is_queued(marking):
+    first = jobs.submit('A4', question_ids=['Q1'])
+    wait_running(first)
+
+    second = jobs.submit('A4', question_ids=['Q2'])
+    assert second is not first
+    assert jobs.submit('A4') not in (first, second)
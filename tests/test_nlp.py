@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from app.marking.nlp import process_multi_nlp
+
+
+def scored(rows):
+    return pd.DataFrame(rows, columns=['question_id', 'student_id', 'num_answer', 'mark', 'score'])
+
+
+def scores_of(result):
+    return {(row.question_id, row.student_id): row.score for row in result.itertuples()}
+
+
+def test_best_num_answer_matches_are_summed():
+    df = scored([('Q1', 'S1', 2, 4, 1.0), ('Q1', 'S1', 2, 4, 0.5), ('Q1', 'S1', 2, 4, 1.0),
+                 ('Q1', 'S2', 2, 4, 0.5)])
+
+    assert scores_of(process_multi_nlp(df, 'A', ['S1', 'S2', 'S3'])) == {
+        ('Q1', 'S1'): 4.0, ('Q1', 'S2'): 1.0, ('Q1', 'S3'): 0.0}
+
+
+def test_missing_num_answer_counts_as_one_like_multiple_sub():
+    df = scored([('Q1', 'S1', None, 3, 0.5), ('Q1', 'S1', None, 3, 1.0), ('Q1', 'S2', None, 3, 0.5),
+                 ('Q2', 'S1', np.nan, 2, 1.0)])
+
+    result = process_multi_nlp(df, 'A')
+
+    assert not result['score'].isna().any()
+    assert scores_of(result) == {('Q1', 'S1'): 3.0, ('Q1', 'S2'): 1.5, ('Q2', 'S1'): 2.0, ('Q2', 'S2'): 0.0}
@@ -0,0 +1,23 @@
+import pytest
+
+from app import papers
+
+
+ETAG = '"0123456789abcdef01234567"'
+
+
+@pytest.mark.parametrize('header', [
+    ETAG,
+    f'W/{ETAG}',
+    f'"other", {ETAG}',
+    f'W/"other",W/{ETAG}',
+    '*',
+])
+def test_if_none_match_with_the_etag_matches(header):
+    assert papers.etag_matches(header, ETAG)
+
+
+@pytest.mark.parametrize('header', [None, '', '"other"', 'W/"other", "0123"', ETAG.strip('"')])
+def test_if_none_match_without_the_etag_does_not_match(header):
+    assert not papers.etag_matches(header, ETAG)
+
@@ -0,0 +1,19 @@
+import pytest
+
+from app.marking.similarity import EmbeddingBackend, SimilarityBackend, StubSimilarityBackend
+
+
+def test_stub_backend_scores_identical_text_highest():
+    scores = StubSimilarityBackend().similarity('the cell wall', ['the cell wall', 'photosynthesis'])
+
+    assert scores[0] == pytest.approx(1.0)
+    assert scores[1] < scores[0]
+
+
+@pytest.mark.parametrize('base', [SimilarityBackend, EmbeddingBackend])
+def test_backend_without_its_scoring_method_cannot_be_created(base):
+    class Incomplete(base):
+        name = 'incomplete'
+
+    with pytest.raises(TypeError):
+        Incomplete()